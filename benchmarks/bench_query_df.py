@@ -0,0 +1,80 @@
+"""
+Client-side cost of turning a result set into a DataFrame: the dict-per-row
+path (cursor(dictionary=True) + pd.DataFrame(rows), then float/datetime
+casts) against the column builder behind DatabaseConnection.query_df().
+
+    python benchmarks/bench_query_df.py --rows 200000
+
+Rows are synthetic (INT, VARCHAR, two DECIMALs, DATETIME) and already fetched,
+so only the conversion is measured, not the server or the network. Time and
+peak memory come from separate runs because tracemalloc slows down the code it
+traces.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pandas as pd
+from mysql.connector import FieldType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conn import _frame_from_rows  # noqa: E402
+
+NAMES = ["product_id", "product_name", "opening_qty", "qty", "created_at"]
+KINDS = [(FieldType.LONG, False), (FieldType.VAR_STRING, False), (FieldType.NEWDECIMAL, False),
+         (FieldType.NEWDECIMAL, True), (FieldType.DATETIME, False)]
+
+
+def make_rows(count):
+    start = datetime(2025, 1, 1)
+    return [
+        (i, f"Product {i}", Decimal(i % 1000) / 4, Decimal(i % 777) / 8 if i % 50 else None,
+         start + timedelta(seconds=i))
+        for i in range(count)
+    ]
+
+
+def dict_path(rows):
+    """What the pages did before query_df: dicts from the cursor, then casts."""
+    records = [dict(zip(NAMES, row)) for row in rows]
+    frame = pd.DataFrame(records)
+    return frame.astype({"opening_qty": "float64", "qty": "float64"}).assign(
+        created_at=pd.to_datetime(frame["created_at"])
+    )
+
+
+def column_path(rows):
+    return _frame_from_rows(rows, NAMES, KINDS)
+
+
+def measure(function, rows, repeat):
+    best = min(_timed(function, rows) for _ in range(repeat))
+    tracemalloc.start()
+    function(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2 ** 20
+
+
+def _timed(function, rows):
+    start = time.perf_counter()
+    function(rows)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DataFrame construction from query rows.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per path (best is reported)")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    pd.testing.assert_frame_equal(dict_path(rows[:1000]), column_path(rows[:1000]), check_dtype=False)
+    for name, function in (("dict rows", dict_path), ("query_df columns", column_path)):
+        seconds, peak_mb = measure(function, rows, args.repeat)
+        print(f"{name:>17}: {seconds:.3f}s, peak {peak_mb:.0f} MB for {args.rows} rows")
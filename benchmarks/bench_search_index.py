@@ -0,0 +1,68 @@
+"""
+ProductSearchIndex on a synthetic catalogue: build time, incremental add and
+per-query latency for each ranking tier.
+
+    python benchmarks/bench_search_index.py --products 100000
+
+Names are drawn from a 20-word vocabulary, so trigram postings are long and
+substring queries match thousands of products: the worst case for the index.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import ProductSearchIndex  # noqa: E402
+
+VOCABULARY = [
+    "sodium", "potassium", "calcium", "chloride", "sulphate", "nitrate", "carbonate", "hydroxide",
+    "acid", "technical", "pure", "grade", "powder", "flakes", "liquid", "solution", "crystal",
+    "industrial", "lab", "bulk",
+]
+
+QUERIES = {
+    "id": ["12345", "99999", "7"],
+    "barcode": ["8900000012345", "890000005"],
+    "name prefix": ["so", "potassium", "calcium chl", "x"],
+    "word prefix": ["chlor", "powd", "grade"],
+    "substring": ["lphat", "ydroxi", "ium chl", "rade pow", "id tech", "ulk liq", "zzz", "ium"],
+}
+
+
+def make_products(count, seed=22):
+    rng = random.Random(seed)
+    return [{
+        "product_id": i,
+        "product_name": " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 4))) + f" {i % 500}",
+        "barcode": f"890{i:010d}",
+        "unit_of_measure": "KG",
+    } for i in range(1, count + 1)]
+
+
+def time_ms(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the product search index.")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    start = time.perf_counter()
+    index = ProductSearchIndex(products)
+    print(f"build: {time.perf_counter() - start:.2f}s for {len(index)} products")
+
+    new = {"product_id": args.products + 1, "product_name": "sodium nitrate extra", "barcode": "123", "unit_of_measure": "KG"}
+    print(f"add: {time_ms(index.add, new):.3f} ms")
+
+    for tier, queries in QUERIES.items():
+        timings = [time_ms(index.search, q) for q in queries for _ in range(args.repeat)]
+        print(f"{tier:>12}: median {statistics.median(timings):.3f} ms, max {max(timings):.3f} ms")
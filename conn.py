@@ -1,37 +1,443 @@
+import heapq
+import os
+import sys
+import threading
+import time
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, FieldType
+from mysql.connector.errors import PoolError
 import bcrypt
-from datetime import datetime
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta
+from instrumentation import STATS, RenderStats, instrument_connection, instrument_methods, unwrap_connection
+from search_index import ProductSearchIndex, scan_products
+
+
+# Connection pool settings (overridable through the environment)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))              # seconds to wait for a free connection
+POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))   # close connections idle longer than this
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))        # re-validate connections idle longer than this
+
+# Orders per IN (...) query when loading order items in bulk
+ITEM_BATCH_SIZE = 1000
+
+# Orders joined with the customer fields every order list displays
+ORDER_SELECT = """
+    SELECT o.*, c.customer_name, c.contact_person_name
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+"""
+
+# Orders per page in the keyset-paginated listings, newest first by (order_date, order_id)
+ORDER_PAGE_SIZE = int(os.getenv("ORDER_PAGE_SIZE", "25"))
+
+# WHERE clauses shared by the full and the paginated listings
+LOADING_HISTORY_STATUSES = ("Loaded", "Cancelled")
+LOADING_HISTORY_WHERE = "o.loading_status IN ('Loaded', 'Cancelled')"
+# Reviewed orders (accounts Approved/Rejected, or any director decision) as disjoint
+# conditions combined with UNION ALL: an OR across the two status columns cannot use
+# an index, while each branch reads idx_orders_accounts_status or idx_orders_director_accounts
+REVIEWED_ORDERS_WHERE = (
+    "o.accounts_approval_status = 'Approved'",
+    "o.accounts_approval_status = 'Rejected'",
+    "o.director_approval_status <> 'Pending' AND "
+    "(o.accounts_approval_status NOT IN ('Approved', 'Rejected') OR o.accounts_approval_status IS NULL)",
+)
+
+# fetch_all_orders() only lists orders whose customer still exists
+ALL_ORDERS_SELECT = """
+    SELECT o.order_id, o.customer_id, c.customer_name, c.contact_person_name, o.salesperson_name,
+           o.total_amount, o.order_date, o.accounts_approval_status, o.director_approval_status, o.loading_status
+    FROM orders o
+    JOIN customers c ON o.customer_id = c.id
+"""
+ALL_ORDERS_ITEM_SELECT = """
+    SELECT
+        oi.id, oi.order_id, oi.product_id, oi.product_name, oi.quantity_ordered,
+        oi.unit_price, oi.total_price, oi.loaded_quantity, oi.loading_remarks
+    FROM order_items oi
+"""
+
+# Rows per executemany() batch in the bulk import methods
+BULK_INSERT_CHUNK = 1000
+
+# Rows fetched per round trip by stream_query()
+STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", "2000"))
+
+# Column dtypes query_df() derives from the MySQL result metadata; anything else stays object
+FLOAT_FIELD_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+INT_FIELD_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG, FieldType.INT24, FieldType.YEAR}
+DATETIME_FIELD_TYPES = {FieldType.DATE, FieldType.NEWDATE, FieldType.DATETIME, FieldType.TIMESTAMP}
+
+# Customers returned per typeahead search
+CUSTOMER_SEARCH_LIMIT = 20
+
+# Quantities below this are treated as zero when drawing down stock lots
+LOT_EPSILON = 1e-6
+
+# Stock lots read and locked per FEFO round trip when drawing a product down
+LOT_BATCH_SIZE = int(os.getenv("LOT_BATCH_SIZE", "20"))
+
+# Stock transactions are retried this many times on deadlock (1213) or lock wait timeout (1205)
+STOCK_RETRIES = 3
+STOCK_RETRY_BACKOFF = 0.05  # seconds, doubled on every retry
+RETRYABLE_LOCK_ERRORS = {1205, 1213}
+
+# Rows read per chunk from GRN spreadsheets, and error messages kept per GRN upload
+GRN_CHUNK_SIZE = 5000
+GRN_MAX_ERRORS = 50
+
+# Rows per page returned by get_stock_ledger()
+LEDGER_PAGE_SIZE = 200
+
+# Reference lists cached process-wide, keyed by their `reference_versions` name
+REFERENCE_QUERIES = {
+    "products": ("product_id", "SELECT product_id, product_name, barcode, unit_of_measure FROM products ORDER BY product_id"),
+    "customers": ("id", "SELECT id, customer_name, contact_person_name, contact FROM customers ORDER BY id"),
+}
+
+# Dashboard counters are shared by all sessions and refreshed at most this often (seconds)
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of MySQL connections shared by every session and rerun.
+    Connections are checked out by DatabaseConnection.connect() and returned by
+    disconnect(); idle connections past POOL_IDLE_TIMEOUT are closed.
+    """
+
+    def __init__(self, connect_args, size=POOL_SIZE, timeout=POOL_TIMEOUT, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.connect_args = connect_args
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (connection, returned_at), most recently returned last
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._counters = {"created": 0, "checkouts": 0, "waits": 0, "timeouts": 0, "evicted": 0}
+
+    def checkout(self):
+        """Borrow a connection, waiting up to `timeout` seconds if the pool is exhausted."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            stale = self._pop_expired()
+            waited = False
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolError(f"No database connection available after {self.timeout}s (pool size {self.size}).")
+                if not waited:
+                    self._counters["waits"] += 1
+                    waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._counters["checkouts"] += 1
+            connection, returned_at = self._idle.pop() if self._idle else (None, None)
+
+        self._close_all(stale)
+        try:
+            if connection is not None and time.monotonic() - returned_at > POOL_PING_AFTER:
+                if not connection.is_connected():
+                    self._close_all([connection])
+                    connection = None
+            if connection is None:
+                connection = mysql.connector.connect(**self.connect_args)
+                with self._cond:
+                    self._counters["created"] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return connection
+
+    def release(self, connection):
+        """Return a connection to the pool, discarding any open transaction or unread result."""
+        try:
+            if connection.unread_result:
+                connection.consume_results()
+            connection.rollback()
+            reusable = True
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+        if not reusable:
+            self._close_all([connection])
+
+    def stats(self):
+        """Snapshot of pool usage counters."""
+        with self._cond:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self._counters,
+            }
+
+    def _pop_expired(self):
+        # Caller holds the lock; the oldest connections sit at the front of the list.
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.pop(0)[0])
+        self._counters["evicted"] += len(expired)
+        return expired
+
+    @staticmethod
+    def _close_all(connections):
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, user, password, database):
+    """Return the shared pool for these credentials, creating it on first use."""
+    key = (host, user, password, database)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool({"host": host, "user": user, "password": password, "database": database})
+        return _pools[key]
+
+
+_dashboard_cache = {"counts": None, "expires": 0.0}
+_dashboard_lock = threading.Lock()
+
+
+# Process-wide product search index and the products version it covers. A build runs on a
+# snapshot of one version; products appended meanwhile are queued and added before it is
+# installed. The previous index keeps serving while a newer version builds.
+_search_index = {"index": None, "version": None, "building": None, "appended": []}
+_search_lock = threading.Lock()
+
+
+def invalidate_dashboard_counts():
+    """Drop the cached dashboard counters so the next dashboard_counts() call re-queries."""
+    with _dashboard_lock:
+        _dashboard_cache["counts"] = None
+
+
+class ReferenceCache:
+    """
+    Process-wide cache of the product and customer lists. Each list is stored with
+    the version stamp it was loaded at; writers bump the stamp in `reference_versions`
+    and readers reload a list only when its stamp has moved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, name, version):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and version is not None and entry["version"] == version:
+            return entry
+        return None
 
+    def put(self, name, version, rows):
+        key = REFERENCE_QUERIES[name][0]
+        entry = {"version": version, "rows": rows, "by_id": {row[key]: row for row in rows},
+                 "by_barcode": None}
+        with self._lock:
+            self._entries[name] = entry
+        return entry
+
+    def append(self, name, version, row):
+        """
+        Extend a cached list with one new row committed at `version`. Only applies when the
+        cache holds the version just before it; otherwise readers reload the list as usual.
+        """
+        key = REFERENCE_QUERIES[name][0]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or version is None or entry["version"] != version - 1:
+                return
+            self._entries[name] = {
+                "version": version,
+                "rows": entry["rows"] + [row],
+                "by_id": {**entry["by_id"], row[key]: row},
+                "by_barcode": entry["by_barcode"],
+            }
+            if entry["by_barcode"] is not None:
+                _index_barcode(entry["by_barcode"], row)
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+REFERENCE_CACHE = ReferenceCache()
+
+
+@instrument_methods
 class DatabaseConnection:
-    def __init__(self, host="localhost", user="root", password="pass", database="rajchemsales"):
+    def __init__(self, host="localhost", user="root", password="pass", database="rajchemsales", pooled=True):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
+        self.pooled = pooled
         self.connection = None
+        self._pool = None
+        self._reference_versions = None
+
+        # Query counters for this render, labelled with the page script that created the connection
+        page = os.path.basename(sys._getframe(1).f_globals.get("__file__", ""))
+        self.render_stats = RenderStats(page)
+        STATS.track_render(self.render_stats)
 
     def connect(self):
-        """Establish a connection to the MySQL database."""
+        """Establish a connection to the MySQL database (borrowed from the shared pool when pooled)."""
+        self._release()
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            if self.connection.is_connected():
-                print("Connected to the database successfully!")
+            if self.pooled:
+                self._pool = get_pool(self.host, self.user, self.password, self.database)
+                self.connection = instrument_connection(self._pool.checkout(), self.render_stats)
+            else:
+                self.connection = instrument_connection(mysql.connector.connect(
+                    host=self.host,
+                    user=self.user,
+                    password=self.password,
+                    database=self.database
+                ), self.render_stats)
+                if self.connection.is_connected():
+                    print("Connected to the database successfully!")
         except Error as e:
             print(f"Error connecting to MySQL: {e}")
             self.connection = None
+            self._pool = None
 
     def disconnect(self):
-        """Close the database connection."""
-        if self.connection and self.connection.is_connected():
+        """Close the database connection, or hand it back to the pool."""
+        if self._pool is not None:
+            self._release()
+        elif self.connection and self.connection.is_connected():
             self.connection.close()
             print("Database connection closed.")
 
+    def _release(self):
+        if self._pool is not None:
+            if self.connection is not None:
+                self._pool.release(unwrap_connection(self.connection))
+            self.connection = None
+            self._pool = None
+
+    def __del__(self):
+        # Pages that never call disconnect() still return their connection once the rerun drops `db`.
+        try:
+            self._release()
+        except Exception:
+            pass
+
+    def stream_query(self, sql, params=None, batch_size=STREAM_BATCH_SIZE, dictionary=False):
+        """
+        Yield the rows of a query without holding the result set in memory.
+        The query runs on a dedicated, unpooled connection with an unbuffered cursor,
+        so rows are read from the server batch_size at a time and the page connection
+        stays usable while the generator is open. Closing the generator early (or an
+        exception in the consumer) closes that connection and discards the rest.
+        :param sql: SELECT statement.
+        :param params: Query parameters.
+        :param batch_size: Rows per fetchmany() round trip.
+        :param dictionary: Yield dicts instead of tuples.
+        :return: Generator of rows, in the column order of the SELECT.
+        """
+        connection = instrument_connection(mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            buffered=False
+        ), self.render_stats)
+        try:
+            cursor = connection.cursor(buffered=False, dictionary=dictionary)
+            cursor.execute(sql, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            # Dropping the connection is cheaper than draining an unread unbuffered result
+            try:
+                unwrap_connection(connection).close()
+            except Error:
+                pass
+
+    def query_df(self, sql, params=None, dtypes=None, chunksize=None, columns=None):
+        """
+        Run a query straight into a DataFrame, building typed columns from tuple rows
+        instead of one dict per row. DECIMAL/FLOAT columns become float64, DATE/DATETIME
+        columns datetime64[ns], integer columns int64 (Int64 when nullable).
+        :param sql: SELECT statement.
+        :param params: Query parameters.
+        :param dtypes: {column: dtype} applied on top of the derived dtypes (e.g. "string").
+        :param chunksize: When set, return an iterator of DataFrames of at most this many rows.
+        :param columns: Column names to use instead of the ones in the SELECT.
+        :return: DataFrame (empty, with `columns`/`dtypes`, on error), or an iterator of DataFrames.
+        """
+        if chunksize:
+            return self._iter_df(sql, params, dtypes, chunksize, columns)
+        try:
+            cursor, names, kinds = self._df_cursor(sql, params, columns)
+            rows = cursor.fetchall()
+            cursor.close()
+            return _frame_from_rows(rows, names, kinds, dtypes)
+        except Exception as e:
+            print(f"Error running query: {e}")
+            return pd.DataFrame(columns=columns or list(dtypes or {})).astype(dtypes or {})
+
+    def _iter_df(self, sql, params, dtypes, chunksize, columns):
+        cursor = None
+        try:
+            cursor, names, kinds = self._df_cursor(sql, params, columns)
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield _frame_from_rows(rows, names, kinds, dtypes)
+        except Exception as e:
+            print(f"Error running query: {e}")
+        finally:
+            # An abandoned iterator leaves unread rows that would block the next query
+            if cursor is not None:
+                if self.connection.unread_result:
+                    self.connection.consume_results()
+                cursor.close()
+
+    def _df_cursor(self, sql, params, columns):
+        """Execute on a tuple cursor; return it with the column names and (field type, nullable) pairs."""
+        if not self.connection or not self.connection.is_connected():
+            self.connect()
+        cursor = self.connection.cursor()
+        cursor.execute(sql, tuple(params or ()))
+        names = columns or list(cursor.column_names)
+        kinds = [(d[1], bool(d[6])) for d in cursor.description]
+        return cursor, names, kinds
+
+    def pool_stats(self):
+        """Usage counters of the shared pool (size, in_use, idle, waits, timeouts, ...)."""
+        return get_pool(self.host, self.user, self.password, self.database).stats()
+
     def create_order(self, order_id, customer_id, user, total_amount, order_date, accounts_approval_status, items, payment_terms):
         """
         Create an order and its associated items.
@@ -84,6 +490,7 @@ class DatabaseConnection:
 
             self.connection.commit()
             cursor.close()
+            invalidate_dashboard_counts()
             return True
         except Exception as e:
             print(f"Error creating order: {e}")
@@ -92,9 +499,125 @@ class DatabaseConnection:
 
 
 
+    def _attach_items(self, cursor, orders, select="SELECT * FROM order_items oi"):
+        """
+        Attach each order's items as order['items'] with one IN (...) query per
+        ITEM_BATCH_SIZE orders, instead of one query per order.
+        :param cursor: Dictionary cursor to run the item queries on.
+        :param orders: List of order dicts (must contain 'order_id').
+        :param select: Item SELECT aliasing order_items as `oi`; must return oi.order_id.
+        :return: The same list of orders.
+        """
+        items_by_order = {order["order_id"]: [] for order in orders}
+        order_ids = list(items_by_order)
+
+        for start in range(0, len(order_ids), ITEM_BATCH_SIZE):
+            batch = order_ids[start:start + ITEM_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"{select} WHERE oi.order_id IN ({placeholders}) ORDER BY oi.order_id, oi.id",
+                tuple(batch)
+            )
+            for item in cursor.fetchall():
+                items_by_order[item["order_id"]].append(item)
+
+        for order in orders:
+            order["items"] = items_by_order[order["order_id"]]
+        return orders
+
+
+    def _fetch_orders_page(self, where, after=None, before=None, page_size=ORDER_PAGE_SIZE,
+                           select=ORDER_SELECT, item_select="SELECT * FROM order_items oi", params=()):
+        """
+        One page of orders, newest first, using a keyset cursor on (order_date, order_id)
+        so the cost of a page does not grow with the number of orders before it.
+        :param where: SQL condition on orders `o` selecting the listing, or a tuple of
+                      disjoint conditions whose pages are merged with UNION ALL.
+        :param after: (order_date, order_id) of the last order of the current page, to get the next (older) page.
+        :param before: (order_date, order_id) of the first order of the current page, to get the previous (newer) page.
+        :param page_size: Orders per page.
+        :param select: Order SELECT aliasing orders as `o`.
+        :param item_select: Item SELECT passed to _attach_items.
+        :param params: Parameters for the placeholders in `where` (in each condition of a tuple).
+        :return: Dict with orders, next_cursor and prev_cursor (None when there is no such page).
+        """
+        page = {"orders": [], "next_cursor": None, "prev_cursor": None}
+        try:
+            if not self.connection or not self.connection.is_connected():
+                self.connect()
+
+            cursor = self.connection.cursor(dictionary=True)
+            keyset, keyset_params = [], []
+            if before is not None:
+                keyset.append("(o.order_date > %s OR (o.order_date = %s AND o.order_id > %s))")
+                keyset_params += [before[0], before[0], before[1]]
+                direction = "ASC"
+            else:
+                if after is not None:
+                    keyset.append("(o.order_date < %s OR (o.order_date = %s AND o.order_id < %s))")
+                    keyset_params += [after[0], after[0], after[1]]
+                direction = "DESC"
+
+            # One extra row tells whether another page exists in that direction
+            branches = [where] if isinstance(where, str) else list(where)
+            queries, query_params = [], []
+            for branch in branches:
+                queries.append(
+                    f"{select} WHERE {' AND '.join([branch] + keyset)} "
+                    f"ORDER BY o.order_date {direction}, o.order_id {direction} LIMIT %s"
+                )
+                query_params += list(params) + keyset_params + [page_size + 1]
+            if len(queries) == 1:
+                query = queries[0]
+            else:
+                # Each branch brings its own first page; the merged page is the first of those
+                query = (" UNION ALL ".join(f"({q})" for q in queries)
+                         + f" ORDER BY order_date {direction}, order_id {direction} LIMIT %s")
+                query_params.append(page_size + 1)
+            cursor.execute(query, tuple(query_params))
+            orders = cursor.fetchall()
+            has_more = len(orders) > page_size
+            orders = orders[:page_size]
+            if before is not None:
+                orders.reverse()
+
+            self._attach_items(cursor, orders, item_select)
+            cursor.close()
+
+            # Going back, the page we came from is always older; going forward, we came from a newer one
+            has_next = has_more if before is None else True
+            has_prev = has_more if before is not None else after is not None
+            if orders and has_next:
+                page["next_cursor"] = (orders[-1]["order_date"], orders[-1]["order_id"])
+            if orders and has_prev:
+                page["prev_cursor"] = (orders[0]["order_date"], orders[0]["order_id"])
+            page["orders"] = orders
+            return page
+        except Exception as e:
+            print("Error fetching orders page:", e)
+            return page
+
+
+    def _count_orders(self, where, select_from="FROM orders o", params=()):
+        """Number of orders matching `where` (or the sum over a tuple of disjoint conditions)."""
+        branches = [where] if isinstance(where, str) else list(where)
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                "SELECT " + " + ".join(f"(SELECT COUNT(*) {select_from} WHERE {branch})" for branch in branches),
+                tuple(params) * len(branches)
+            )
+            count = cursor.fetchone()[0]
+            cursor.close()
+            return count
+        except Exception as e:
+            print("Error counting orders:", e)
+            return 0
+
+
     def fetch_orders(self):
         """
-        Fetch all orders along with their items.
+        Fetch all orders along with their customer details and items.
         :return: List of orders with associated items.
         """
         if not self.connection or not self.connection.is_connected():
@@ -105,15 +628,11 @@ class DatabaseConnection:
             cursor = self.connection.cursor(dictionary=True)
 
             # Fetch orders
-            order_query = "SELECT * FROM orders"
-            cursor.execute(order_query)
+            cursor.execute(ORDER_SELECT)
             orders = cursor.fetchall()
 
-            # Fetch items for each order
-            for order in orders:
-                item_query = "SELECT * FROM order_items WHERE order_id = %s"
-                cursor.execute(item_query, (order['order_id'],))
-                order['items'] = cursor.fetchall()
+            # Fetch items for all orders in one batch
+            self._attach_items(cursor, orders)
 
             cursor.close()
             return orders
@@ -128,13 +647,11 @@ class DatabaseConnection:
 
         try:
             cursor = self.connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM orders WHERE accounts_approval_status = 'Pending'")
+            cursor.execute(ORDER_SELECT + " WHERE o.accounts_approval_status = 'Pending'")
             orders = cursor.fetchall()
 
-            # Optional: fetch items for each order too
-            for order in orders:
-                cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order["order_id"],))
-                order["items"] = cursor.fetchall()
+            # Optional: fetch items for the orders too
+            self._attach_items(cursor, orders)
 
             return orders
         except Error as e:
@@ -147,30 +664,125 @@ class DatabaseConnection:
             cursor = self.connection.cursor()
             query = """
                 INSERT INTO products 
-                (product_name, barcode, unit_of_measure, opening_qty, batch_number, expiration_date)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                (product_name, barcode, unit_of_measure, opening_qty, qty, batch_number, expiration_date)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
             """
-            cursor.execute(query, (name, barcode, uom, opening_qty, batch_number, expiration_date))
+            cursor.execute(query, (name, barcode, uom, opening_qty, opening_qty or 0, batch_number, expiration_date))
+            product_id = cursor.lastrowid
+            # Opening stock is the product's first lot
+            _receive_lots(cursor, [(product_id, batch_number, expiration_date, opening_qty or 0)])
+            version = self._bump_reference_version(cursor, "products", invalidate=False)
             self.connection.commit()
+
+            # Extend the cached list and search index in place instead of reloading 100k products
+            product = {"product_id": product_id, "product_name": name, "barcode": barcode, "unit_of_measure": uom}
+            REFERENCE_CACHE.append("products", version, product)
+            _add_to_search_index(version, product)
             return True
         except Exception as e:
             print("Add product error:", e)
             return False
         
         
+    def add_products_bulk(self, df):
+        """
+        Validate and insert a product catalogue in a single transaction.
+        :param df: DataFrame with product_name, unit_of_measure and opening_qty columns,
+                   and optionally barcode, batch_number and expiration_date.
+        :return: Dict with inserted, failed, errors (DataFrame of row/error for rejected
+                 rows), error (database error, if the batch was rolled back) and rows_per_second.
+        """
+        started = time.perf_counter()
+        result = {"inserted": 0, "failed": 0, "errors": pd.DataFrame(columns=["row", "error"]),
+                  "error": None, "rows_per_second": 0.0}
+
+        data = df.copy()
+        for col in ("barcode", "batch_number", "expiration_date"):
+            if col not in data.columns:
+                data[col] = None
+
+        name = _text_column(data["product_name"])
+        uom = _text_column(data["unit_of_measure"])
+        barcode = _text_column(data["barcode"])
+        batch_number = _text_column(data["batch_number"])
+        opening_qty = pd.to_numeric(data["opening_qty"], errors="coerce")
+        expiry_text = _text_column(data["expiration_date"])
+        expiration_date = pd.to_datetime(expiry_text, errors="coerce")
+
+        # First failing check per row wins
+        error = pd.Series("", index=data.index, dtype="object")
+        for mask, message in (
+            (name.isna(), "missing product_name"),
+            (uom.isna(), "missing unit_of_measure"),
+            (opening_qty.isna(), "opening_qty is not a number"),
+            (opening_qty < 0, "opening_qty is negative"),
+            (expiry_text.notna() & expiration_date.isna(), "invalid expiration_date"),
+        ):
+            error = error.mask(mask.fillna(False) & (error == ""), message)
+
+        rejected = error != ""
+        result["errors"] = pd.DataFrame({"row": data.index[rejected], "error": error[rejected].values})
+        result["failed"] = int(rejected.sum())
+
+        valid = ~rejected
+        rows = list(zip(
+            _nullable(name[valid]),
+            _nullable(barcode[valid]),
+            _nullable(uom[valid]),
+            opening_qty[valid].astype(float).tolist(),
+            _nullable(batch_number[valid]),
+            _nullable(expiration_date[valid].dt.date),
+        ))
+        if not rows:
+            return result
+
+        try:
+            cursor = self.connection.cursor()
+            query = """
+                INSERT INTO products 
+                (product_name, barcode, unit_of_measure, opening_qty, qty, batch_number, expiration_date)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """
+            # New products get ids above every existing one, whatever the batching or autoinc mode
+            cursor.execute("SELECT COALESCE(MAX(product_id), 0) FROM products")
+            last_existing_id = cursor.fetchone()[0]
+            for start in range(0, len(rows), BULK_INSERT_CHUNK):
+                chunk = rows[start:start + BULK_INSERT_CHUNK]
+                cursor.executemany(query, [row[:4] + (row[3],) + row[4:] for row in chunk])
+            # Opening stock becomes each new product's first lot, as in migration 7; products
+            # another session created meanwhile already have theirs
+            cursor.execute("""
+                INSERT INTO stock_lots (product_id, batch_number, expiration_date, qty)
+                SELECT p.product_id, p.batch_number, p.expiration_date, p.qty
+                FROM products p
+                WHERE p.product_id > %s AND p.qty > 0
+                  AND NOT EXISTS (SELECT 1 FROM stock_lots l WHERE l.product_id = p.product_id)
+            """, (last_existing_id,))
+            self._bump_reference_version(cursor, "products")
+            self.connection.commit()
+            cursor.close()
+            result["inserted"] = len(rows)
+        except Exception as e:
+            print("Bulk product import error:", e)
+            self.connection.rollback()
+            result["error"] = str(e)
+            result["failed"] += len(rows)
+
+        elapsed = time.perf_counter() - started
+        result["rows_per_second"] = round(result["inserted"] / elapsed, 1) if elapsed > 0 else 0.0
+        return result
+
+
     def fetch_director_pending_orders(self):
         try:
             cursor = self.connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT * FROM orders 
-                WHERE director_approval_status = 'Pending'
-                ORDER BY order_date DESC
+            cursor.execute(ORDER_SELECT + """
+                WHERE o.director_approval_status = 'Pending'
+                ORDER BY o.order_date DESC
             """)
             orders = cursor.fetchall()
 
-            for order in orders:
-                cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order['order_id'],))
-                order['items'] = cursor.fetchall()
+            self._attach_items(cursor, orders)
 
             return orders
         except Exception as e:
@@ -187,6 +799,7 @@ class DatabaseConnection:
                 WHERE order_id = %s
             """, (status, remarks, order_id))
             self.connection.commit()
+            invalidate_dashboard_counts()
             return True
         except Exception as e:
             print("Approval update error:", e)
@@ -194,13 +807,49 @@ class DatabaseConnection:
         
         
     def fetch_all_products(self):
-        try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute("SELECT product_id, product_name FROM products")
-            return cursor.fetchall()
-        except Exception as e:
-            print("Error fetching products:", e)
-            return []
+        """All products (id, name, barcode, unit) from the shared reference cache, as copies."""
+        return [dict(row) for row in self._reference_data("products")["rows"]]
+
+    def get_product(self, product_id):
+        """O(1) product lookup by id from the shared reference cache (a copy, or None)."""
+        return _copy_row(self._reference_data("products")["by_id"].get(product_id))
+
+    def product_search_index(self):
+        """
+        Search index over the cached product list, built once per cache version on a
+        background thread so no page render waits for it. Until it is ready the previous
+        version's index is returned, or None if this process has not built one yet.
+        """
+        entry = self._reference_data("products")
+        with _search_lock:
+            index, current = _search_index["index"], _search_index["version"] == entry["version"]
+        # An entry without a version is a one-off read after an error, not worth indexing
+        if not current and entry["version"] is not None:
+            _build_search_index(entry["version"], entry["rows"])
+        return index
+
+    def search_products(self, query, limit=20):
+        """Ranked product matches on name, product ID or barcode (see search_index)."""
+        index = self.product_search_index()
+        if index is None:
+            matches = scan_products(self._reference_data("products")["rows"], query, limit)
+        else:
+            matches = index.search(query, limit)
+        return [dict(row) for row in matches]
+
+    def get_product_by_barcode(self, barcode):
+        """
+        O(1) product lookup by scanned barcode. The barcode map is built once per
+        products cache version, so any product change (version bump) rebuilds it.
+        :return: Product dict, or None for an unknown barcode.
+        """
+        entry = self._reference_data("products")
+        if entry.get("by_barcode") is None:
+            by_barcode = {}
+            for row in entry["rows"]:
+                _index_barcode(by_barcode, row)
+            entry["by_barcode"] = by_barcode
+        return _copy_row(entry["by_barcode"].get(str(barcode or "").strip()))
         
     
     def update_director_approval(self, order_id, status, remarks):
@@ -212,6 +861,7 @@ class DatabaseConnection:
                 WHERE order_id = %s
             """, (status, remarks, order_id))
             self.connection.commit()
+            invalidate_dashboard_counts()
             return True
         except Exception as e:
             print("Director approval error:", e)
@@ -220,48 +870,48 @@ class DatabaseConnection:
     def fetch_reviewed_orders(self):
         try:
             cursor = self.connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT * FROM orders 
-                WHERE accounts_approval_status IN ('Approved', 'Rejected')
-                OR director_approval_status != 'Pending'
-                ORDER BY order_date DESC
-            """)
+            cursor.execute(
+                " UNION ALL ".join(f"({ORDER_SELECT} WHERE {branch})" for branch in REVIEWED_ORDERS_WHERE)
+                + " ORDER BY order_date DESC"
+            )
             orders = cursor.fetchall()
 
-            for order in orders:
-                cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order['order_id'],))
-                order['items'] = cursor.fetchall()
+            self._attach_items(cursor, orders)
 
             return orders
         except Exception as e:
             print("Error fetching reviewed orders:", e)
             return []
+
+    def fetch_reviewed_orders_page(self, after=None, before=None, page_size=ORDER_PAGE_SIZE):
+        """Keyset-paginated fetch_reviewed_orders(); see _fetch_orders_page for the cursors."""
+        return self._fetch_orders_page(REVIEWED_ORDERS_WHERE, after, before, page_size)
+
+    def count_reviewed_orders(self):
+        return self._count_orders(REVIEWED_ORDERS_WHERE)
         
         
     def fetch_director_approved_orders(self):
         try:
             cursor = self.connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT * FROM orders 
-                WHERE director_approval_status = 'Approved'
-                AND loading_status = 'Pending Loading'
-                ORDER BY order_date DESC
+            cursor.execute(ORDER_SELECT + """
+                WHERE o.director_approval_status = 'Approved'
+                AND o.loading_status = 'Pending Loading'
+                ORDER BY o.order_date DESC
             """)
             orders = cursor.fetchall()
 
-            for order in orders:
-                cursor.execute("""
-                    SELECT 
-                        oi.id AS id,
-                        oi.product_id,
-                        p.product_name,
-                        oi.quantity_ordered,
-                        oi.loaded_quantity
-                    FROM order_items oi
-                    JOIN products p ON oi.product_id = p.product_id
-                    WHERE oi.order_id = %s
-                """, (order['order_id'],))
-                order['items'] = cursor.fetchall()
+            self._attach_items(cursor, orders, """
+                SELECT 
+                    oi.id AS id,
+                    oi.order_id,
+                    oi.product_id,
+                    p.product_name,
+                    oi.quantity_ordered,
+                    oi.loaded_quantity
+                FROM order_items oi
+                JOIN products p ON oi.product_id = p.product_id
+            """)
 
             return orders
         except Exception as e:
@@ -280,19 +930,66 @@ class DatabaseConnection:
                 WHERE order_id = %s
             """, (status, remarks, order_id))
 
-            # Update each item's loaded quantity and remarks
-            for item in item_updates:
-                cursor.execute("""
-                    UPDATE order_items
-                    SET loaded_quantity = %s, loading_remarks = %s
-                    WHERE id = %s
-                """, (item['loaded_quantity'], item['loading_remarks'], item['item_id']))
+            # Update every item's loaded quantity and remarks in one statement
+            _case_update(cursor, "order_items", "id", ("loaded_quantity", "loading_remarks"), [
+                (item['item_id'], item['loaded_quantity'], item['loading_remarks'])
+                for item in item_updates
+            ])
 
             self.connection.commit()
+            invalidate_dashboard_counts()
             return True
         except Exception as e:
             print("Error updating loading status:", e)
             return False
+
+
+    def fulfil_order(self, order_id, item_updates, remarks):
+        """
+        Mark an order as Loaded in one transaction: order status, loaded quantities,
+        one aggregated stock decrease per product, and a FEFO draw-down of the stock
+        lots recorded as one OUT movement per batch picked.
+        :param order_id: Order being loaded.
+        :param item_updates: List of dicts with item_id, loaded_quantity and loading_remarks.
+        :param remarks: General loading remarks for the order.
+        :return: True if successful, False otherwise (including an order that is already Loaded).
+        """
+        def load(cursor):
+            # Refuses a second "Mark as Loaded", which would deduct the stock twice
+            cursor.execute("""
+                UPDATE orders
+                SET loading_status = 'Loaded', loading_remarks = %s
+                WHERE order_id = %s AND loading_status <> 'Loaded'
+            """, (remarks, order_id))
+            if cursor.rowcount == 0:
+                raise ValueError(f"Order {order_id} does not exist or is already loaded")
+
+            cursor.execute("SELECT id, product_id FROM order_items WHERE order_id = %s", (order_id,))
+            product_by_item = dict(cursor.fetchall())
+
+            item_rows, stock_deltas, demands = [], {}, []
+            for item in item_updates:
+                product_id = product_by_item.get(item["item_id"])
+                if product_id is None:
+                    raise ValueError(f"Item {item['item_id']} does not belong to order {order_id}")
+                loaded_qty = float(item["loaded_quantity"] or 0)
+
+                item_rows.append((item["item_id"], loaded_qty, item["loading_remarks"]))
+                if loaded_qty > 0:
+                    stock_deltas[product_id] = stock_deltas.get(product_id, 0.0) - loaded_qty
+                    demands.append((product_id, loaded_qty, f"Order {order_id}", item["loading_remarks"]))
+
+            _case_update(cursor, "order_items", "id", ("loaded_quantity", "loading_remarks"), item_rows)
+            _apply_stock_deltas(cursor, stock_deltas)
+            _insert_stock_movements(cursor, _draw_down_lots(cursor, demands))
+
+        try:
+            self._run_stock_transaction(load)
+            invalidate_dashboard_counts()
+            return True
+        except Exception as e:
+            print("Error fulfilling order:", e)
+            return False
         
         
     def fetch_orders_by_accounts_status(self, status):
@@ -309,19 +1006,14 @@ class DatabaseConnection:
             cursor = self.connection.cursor(dictionary=True)
 
             # Fetch orders matching the accounts approval status
-            cursor.execute("""
-                SELECT * FROM orders 
-                WHERE accounts_approval_status = %s 
-                ORDER BY order_date DESC
+            cursor.execute(ORDER_SELECT + """
+                WHERE o.accounts_approval_status = %s 
+                ORDER BY o.order_date DESC
             """, (status,))
             orders = cursor.fetchall()
 
-            # For each order, fetch its items
-            for order in orders:
-                cursor.execute("""
-                    SELECT * FROM order_items WHERE order_id = %s
-                """, (order['order_id'],))
-                order['items'] = cursor.fetchall()
+            # Fetch the items of all matching orders in one batch
+            self._attach_items(cursor, orders)
 
             cursor.close()
             return orders
@@ -334,21 +1026,107 @@ class DatabaseConnection:
     def fetch_loading_history(self):
         try:
             cursor = self.connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT * FROM orders 
-                WHERE loading_status IN ('Loaded', 'Cancelled')
-                ORDER BY order_date DESC
+            cursor.execute(ORDER_SELECT + f"""
+                WHERE {LOADING_HISTORY_WHERE}
+                ORDER BY o.order_date DESC
             """)
             orders = cursor.fetchall()
 
-            for order in orders:
-                cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order['order_id'],))
-                order['items'] = cursor.fetchall()
+            self._attach_items(cursor, orders)
 
             return orders
         except Exception as e:
             print("Error fetching loading history:", e)
             return []
+
+    def fetch_loading_history_page(self, after=None, before=None, page_size=ORDER_PAGE_SIZE):
+        """Keyset-paginated fetch_loading_history(); see _fetch_orders_page for the cursors."""
+        return self._fetch_orders_page(LOADING_HISTORY_WHERE, after, before, page_size)
+
+    def count_loading_history(self):
+        return self._count_orders(LOADING_HISTORY_WHERE)
+
+    def search_loading_history(self, start=None, end=None, customer_ids=None, statuses=None,
+                               after=None, before=None, page_size=ORDER_PAGE_SIZE):
+        """
+        Filtered, keyset-paginated loading history; every filter is applied in SQL.
+        :param start: First order day (date or datetime); None for no lower bound.
+        :param end: Last order day, inclusive when a date; None for no upper bound.
+        :param customer_ids: Only these customers; empty or None for all.
+        :param statuses: Subset of 'Loaded'/'Cancelled'; empty or None for both.
+        :param after: Cursor for the next page (see _fetch_orders_page).
+        :param before: Cursor for the previous page.
+        :param page_size: Orders per page.
+        :return: The page dict (orders, next_cursor, prev_cursor) plus `total` and
+                 `status_counts` ({status: orders}) for the whole filtered history.
+        """
+        statuses = [s for s in (statuses or LOADING_HISTORY_STATUSES) if s in LOADING_HISTORY_STATUSES]
+        clauses = [f"o.loading_status IN ({', '.join(['%s'] * len(statuses))})"]
+        params = list(statuses)
+        if start is not None:
+            clauses.append("o.order_date >= %s")
+            params.append(_as_datetime(start))
+        if end is not None:
+            clauses.append("o.order_date < %s" if not isinstance(end, datetime) else "o.order_date <= %s")
+            params.append(_as_datetime(end, end_of_day=True))
+        if customer_ids:
+            clauses.append(f"o.customer_id IN ({', '.join(['%s'] * len(customer_ids))})")
+            params += list(customer_ids)
+        where = " AND ".join(clauses)
+
+        page = self._fetch_orders_page(where, after, before, page_size, params=params)
+        page["status_counts"] = {status: 0 for status in statuses}
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(f"""
+                SELECT o.loading_status, COUNT(*)
+                FROM orders o
+                WHERE {where}
+                GROUP BY o.loading_status
+            """, tuple(params))
+            page["status_counts"].update(dict(cursor.fetchall()))
+            cursor.close()
+        except Exception as e:
+            print("Error counting loading history:", e)
+        page["total"] = sum(page["status_counts"].values())
+        return page
+
+    def loading_history_filter_options(self):
+        """
+        Values for the Loading History filter widgets, without loading any orders.
+        :return: Dict with `customers` (id, customer_name, contact_person_name of every
+                 customer that has loaded or cancelled orders) and the `min_date`/`max_date`
+                 of those orders (None when there are none).
+        """
+        options = {"customers": [], "min_date": None, "max_date": None}
+        try:
+            if not self.connection or not self.connection.is_connected():
+                self.connect()
+
+            cursor = self.connection.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT MIN(o.order_date) AS min_date, MAX(o.order_date) AS max_date
+                FROM orders o
+                WHERE {LOADING_HISTORY_WHERE}
+            """)
+            options.update(cursor.fetchone() or {})
+
+            # Driven from the loading_status index, then one primary-key lookup per customer
+            cursor.execute(f"""
+                SELECT c.id, c.customer_name, c.contact_person_name
+                FROM (
+                    SELECT DISTINCT o.customer_id
+                    FROM orders o
+                    WHERE {LOADING_HISTORY_WHERE}
+                ) h
+                JOIN customers c ON c.id = h.customer_id
+                ORDER BY c.customer_name, c.contact_person_name
+            """)
+            options["customers"] = cursor.fetchall()
+            cursor.close()
+        except Exception as e:
+            print("Error fetching loading history filters:", e)
+        return options
         
     
     def get_user_by_username(self, username):
@@ -387,6 +1165,35 @@ class DatabaseConnection:
         return None
     
     
+    def dashboard_counts(self):
+        """
+        All workflow-stage counters in one conditional-aggregation query, cached
+        process-wide for DASHBOARD_CACHE_TTL seconds.
+        :return: Dict with total_orders, accounts_pending, director_pending,
+                 loading_pending, loaded and cancelled.
+        """
+        with _dashboard_lock:
+            if _dashboard_cache["counts"] is not None and time.monotonic() < _dashboard_cache["expires"]:
+                return dict(_dashboard_cache["counts"])
+
+        query = """
+            SELECT
+                COUNT(*) AS total_orders,
+                SUM(accounts_approval_status = 'Pending') AS accounts_pending,
+                SUM(accounts_approval_status = 'Approved' AND director_approval_status = 'Pending') AS director_pending,
+                SUM(director_approval_status = 'Approved' AND loading_status = 'Pending Loading') AS loading_pending,
+                SUM(loading_status = 'Loaded') AS loaded,
+                SUM(loading_status = 'Cancelled') AS cancelled
+            FROM orders
+        """
+        row = self.fetch_one(query, ())
+        counts = {key: int(value or 0) for key, value in row.items()}
+
+        with _dashboard_lock:
+            _dashboard_cache["counts"] = counts
+            _dashboard_cache["expires"] = time.monotonic() + DASHBOARD_CACHE_TTL
+        return dict(counts)
+
     def count_pending_approvals_for_accounts(self):
         query = "SELECT COUNT(*) AS count FROM orders WHERE accounts_approval_status = 'Pending'"
         return self.fetch_one(query, ())["count"]
@@ -413,6 +1220,89 @@ class DatabaseConnection:
         except Error as e:
             print(f"Error inserting GRN item: {e}")
 
+    def save_grn(self, grn_id, rows):
+        """
+        Save every item of a GRN in one transaction.
+        :param grn_id: GRN number; rejected if any item already uses it.
+        :param rows: DataFrame, or iterable of DataFrame chunks (see read_grn_chunks),
+                     with product_id and ordered_qty columns.
+        :return: Dict with saved (item count), error_count and errors (first GRN_MAX_ERRORS
+                 messages). Nothing is saved when there are errors.
+        """
+        result = {"saved": 0, "error_count": 0, "errors": []}
+
+        def reject(message):
+            result["error_count"] += 1
+            if len(result["errors"]) < GRN_MAX_ERRORS:
+                result["errors"].append(message)
+
+        grn_id = (grn_id or "").strip()
+        if not grn_id:
+            reject("GRN ID is required.")
+            return result
+        if isinstance(rows, pd.DataFrame):
+            rows = [rows]
+
+        # The whole catalogue in one (cached) lookup
+        known_ids = set(self._reference_data("products")["by_id"])
+
+        try:
+            cursor = self.connection.cursor()
+
+            # Locks the grn_id index range too, so two uploads of the same GRN cannot both pass
+            cursor.execute("SELECT id FROM grn_items WHERE grn_id = %s LIMIT 1 FOR UPDATE", (grn_id,))
+            if cursor.fetchone():
+                self.connection.rollback()
+                reject(f"GRN {grn_id} already exists.")
+                return result
+
+            query = """
+                INSERT INTO grn_items (grn_id, product_id, ordered_qty, received_qty, created_at)
+                VALUES (%s, %s, %s, %s, %s)
+            """
+            now = datetime.now()
+            offset = 0
+            for chunk in rows:
+                missing = {"product_id", "ordered_qty"} - set(chunk.columns)
+                if missing:
+                    reject(f"Missing column(s): {', '.join(sorted(missing))}.")
+                    break
+
+                product_id = pd.to_numeric(chunk["product_id"], errors="coerce")
+                ordered_qty = pd.to_numeric(chunk["ordered_qty"], errors="coerce")
+                bad_product = product_id.isna() | ~product_id.isin(known_ids)
+                bad_qty = ordered_qty.isna() | (ordered_qty < 0)
+
+                for position in (bad_product | bad_qty).to_numpy().nonzero()[0]:
+                    line = offset + position + 1
+                    if bad_product.iloc[position]:
+                        reject(f"Row {line}: unknown product_id '{chunk['product_id'].iloc[position]}'.")
+                    else:
+                        reject(f"Row {line}: invalid ordered_qty '{chunk['ordered_qty'].iloc[position]}'.")
+                offset += len(chunk)
+
+                # Keep validating after the first error, but stop writing
+                if result["error_count"]:
+                    continue
+                cursor.executemany(query, [
+                    (grn_id, int(pid), float(qty), 0.0, now)
+                    for pid, qty in zip(product_id, ordered_qty)
+                ])
+                result["saved"] += len(chunk)
+
+            if result["error_count"]:
+                self.connection.rollback()
+                result["saved"] = 0
+            else:
+                self.connection.commit()
+            cursor.close()
+        except Exception as e:
+            print(f"Error saving GRN: {e}")
+            self.connection.rollback()
+            result["saved"] = 0
+            reject(f"Database error: {e}")
+        return result
+
     def get_grn_items(self, grn_id):
         """Fetch GRN items for a given GRN ID."""
         try:
@@ -457,21 +1347,61 @@ class DatabaseConnection:
         return []
 
 
-    def decrease_product_quantity(self, product_id, qty_to_subtract):
-        """Decrease the quantity of a product when loading is done."""
+    def verify_grn(self, grn_id, verified_lines):
+        """
+        Post a GRN verification in one transaction: verified quantities and discrepancies
+        on grn_items, one aggregated stock increase per product, a stock lot per line
+        (batch = GRN number) and the IN stock movements.
+        :param grn_id: GRN being verified.
+        :param verified_lines: List of dicts with the grn_items 'id' and its 'verified_qty'.
+        :return: True if successful, False otherwise (including lines that are already verified).
+        """
+        def post(cursor):
+            # Product and ordered qty come from the GRN itself, not from the page. The lines are
+            # locked so a second, concurrent verification waits and then sees verified_qty set.
+            cursor.execute(
+                "SELECT id, product_id, ordered_qty, verified_qty FROM grn_items WHERE grn_id = %s FOR UPDATE",
+                (grn_id,)
+            )
+            items = {row[0]: row for row in cursor.fetchall()}
+
+            item_updates, stock_deltas, lots, movements = [], {}, [], []
+            for line in verified_lines:
+                item = items.get(line["id"])
+                if item is None:
+                    raise ValueError(f"GRN item {line['id']} does not belong to {grn_id}")
+                _, product_id, ordered_qty, already_verified = item
+                # Refuses a second verification, which would post the stock (and a lot) twice
+                if already_verified is not None:
+                    raise ValueError(f"GRN item {line['id']} of {grn_id} is already verified")
+                verified_qty = float(line["verified_qty"])
+
+                item_updates.append((item[0], verified_qty, verified_qty - float(ordered_qty)))
+                stock_deltas[product_id] = stock_deltas.get(product_id, 0.0) + verified_qty
+                lots.append((product_id, grn_id, None, verified_qty))
+                movements.append((product_id, 'IN', verified_qty, grn_id, "GRN Verified Entry", grn_id))
+
+            _case_update(cursor, "grn_items", "id", ("verified_qty", "discrepancy"), item_updates)
+            _apply_stock_deltas(cursor, stock_deltas)
+            _receive_lots(cursor, lots)
+            _insert_stock_movements(cursor, movements)
+
         try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
+            self._run_stock_transaction(post)
+            return True
+        except Exception as e:
+            print(f"Error verifying GRN: {e}")
+            return False
 
-            cursor = self.connection.cursor()
-            query = """
-                UPDATE products
-                SET qty = qty - %s
-                WHERE product_id = %s
-            """
-            cursor.execute(query, (qty_to_subtract, product_id))
-            self.connection.commit()
 
+    def decrease_product_quantity(self, product_id, qty_to_subtract):
+        """Decrease the quantity of a product when loading is done."""
+        def decrease(cursor):
+            _apply_stock_deltas(cursor, {product_id: -float(qty_to_subtract)})
+            _adjust_lots(cursor, product_id, -float(qty_to_subtract))
+
+        try:
+            self._run_stock_transaction(decrease)
         except Exception as e:
             print(f"Error decreasing product quantity: {e}")
             
@@ -496,38 +1426,49 @@ class DatabaseConnection:
             
     def increase_product_quantity(self, product_id, qty_to_add):
         """Increase the quantity of a product in inventory."""
-        try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
-
-            cursor = self.connection.cursor()
-            query = """
-                UPDATE products
-                SET qty = qty + %s
-                WHERE product_id = %s
-            """
-            cursor.execute(query, (qty_to_add, product_id))
-            self.connection.commit()
+        def increase(cursor):
+            _apply_stock_deltas(cursor, {product_id: float(qty_to_add)})
+            _adjust_lots(cursor, product_id, float(qty_to_add))
 
+        try:
+            self._run_stock_transaction(increase)
         except Exception as e:
             print(f"Error increasing product quantity: {e}")
+
+
+    def _run_stock_transaction(self, work):
+        """
+        Run work(cursor) in a transaction and commit it. Deadlocks and lock wait
+        timeouts are rolled back and retried up to STOCK_RETRIES times; any other
+        error is rolled back and re-raised.
+        :return: Whatever work returned.
+        """
+        for attempt in range(STOCK_RETRIES + 1):
+            if not self.connection:
+                self.connect()
+            cursor = self.connection.cursor()
+            try:
+                result = work(cursor)
+                self.connection.commit()
+                return result
+            except Error as e:
+                self.connection.rollback()
+                if e.errno not in RETRYABLE_LOCK_ERRORS or attempt == STOCK_RETRIES:
+                    raise
+                time.sleep(STOCK_RETRY_BACKOFF * (2 ** attempt))
+            except Exception:
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.close()
             
             
     def get_product_details(self, product_id):
-        """Fetch product name and unit of measure from products table."""
-        try:
-            cursor = self.connection.cursor(dictionary=True)
-            query = """
-                SELECT product_name, unit_of_measure 
-                FROM products 
-                WHERE product_id = %s
-            """
-            cursor.execute(query, (product_id,))
-            result = cursor.fetchone()
-            return result if result else {}
-        except Error as e:
-            print(f"Error fetching product details: {e}")
+        """Fetch product name and unit of measure (from the product reference cache)."""
+        product = self.get_product(product_id)
+        if not product:
             return {}
+        return {"product_name": product["product_name"], "unit_of_measure": product["unit_of_measure"]}
 
 
     def get_product_opening_info(self, product_id):
@@ -556,6 +1497,7 @@ class DatabaseConnection:
                 VALUES (%s, %s, %s, %s)
             """
             cursor.execute(query, (name, contact, address, contact_person_name))
+            self._bump_reference_version(cursor, "customers")
             self.connection.commit()
             return True
         except Exception as e:
@@ -580,31 +1522,187 @@ class DatabaseConnection:
         
         
         
+    def bulk_upsert_customers(self, df):
+        """
+        Insert the new customers of an upload in one transaction, skipping duplicates.
+        Duplicates are matched on (customer_name, contact), case-insensitively like MySQL,
+        both within the file and against the customers table.
+        :param df: DataFrame with customer_name and contact, optionally address and contact_person_name.
+        :return: Dict with inserted, duplicates_in_file, existing, invalid and error counts/message.
+        """
+        result = {"inserted": 0, "duplicates_in_file": 0, "existing": 0, "invalid": 0, "error": None}
+
+        data = pd.DataFrame({
+            "customer_name": _text_column(df["customer_name"]),
+            "contact": _text_column(df["contact"]),
+            "address": _text_column(df["address"]) if "address" in df.columns else None,
+            "contact_person_name": (
+                _text_column(df["contact_person_name"]) if "contact_person_name" in df.columns else None
+            ),
+        })
+
+        invalid = data["customer_name"].isna() | data["contact"].isna()
+        result["invalid"] = int(invalid.sum())
+        data = data[~invalid]
+
+        data = data.assign(
+            _key_name=data["customer_name"].str.casefold(),
+            _key_contact=data["contact"].str.casefold(),
+        )
+        deduped = data.drop_duplicates(["_key_name", "_key_contact"])
+        result["duplicates_in_file"] = len(data) - len(deduped)
+        if deduped.empty:
+            return result
+
+        try:
+            cursor = self.connection.cursor()
+
+            # One set-based lookup (chunked for very large files) for keys already in the table
+            keys = list(zip(deduped["customer_name"], deduped["contact"]))
+            existing = set()
+            for start in range(0, len(keys), BULK_INSERT_CHUNK):
+                chunk = keys[start:start + BULK_INSERT_CHUNK]
+                placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+                cursor.execute(
+                    f"SELECT customer_name, contact FROM customers WHERE (customer_name, contact) IN ({placeholders})",
+                    tuple(value for key in chunk for value in key)
+                )
+                existing.update((str(n).casefold(), str(c).casefold()) for n, c in cursor.fetchall())
+
+            is_new = [key not in existing for key in zip(deduped["_key_name"], deduped["_key_contact"])]
+            survivors = deduped[is_new]
+            result["existing"] = len(deduped) - len(survivors)
+
+            rows = list(zip(
+                _nullable(survivors["customer_name"]),
+                _nullable(survivors["contact"]),
+                _nullable(survivors["address"]),
+                _nullable(survivors["contact_person_name"]),
+            ))
+            if rows:
+                query = """
+                    INSERT INTO customers (customer_name, contact, address, contact_person_name)
+                    VALUES (%s, %s, %s, %s)
+                """
+                for start in range(0, len(rows), BULK_INSERT_CHUNK):
+                    cursor.executemany(query, rows[start:start + BULK_INSERT_CHUNK])
+                self._bump_reference_version(cursor, "customers")
+            self.connection.commit()
+            cursor.close()
+            result["inserted"] = len(rows)
+        except Exception as e:
+            print("Bulk customer upload error:", e)
+            self.connection.rollback()
+            result["error"] = str(e)
+        return result
+
     def get_all_customers(self):
-        """Fetch all customer names for use in dropdowns or templates."""
+        """Fetch all customer names for use in dropdowns or templates (copies from the reference cache)."""
+        return [dict(row) for row in self._reference_data("customers")["rows"]]
+
+    def search_customers(self, prefix, limit=CUSTOMER_SEARCH_LIMIT):
+        """
+        Customers whose name or contact person starts with `prefix` (case-insensitive),
+        for typeahead pickers. Each half of the UNION is an index range scan, so the
+        cost follows `limit` rather than the number of customers.
+        :param prefix: Text typed so far.
+        :param limit: Maximum number of customers returned.
+        :return: List of customer dicts (id, customer_name, contact_person_name, contact), by name.
+        """
+        prefix = (prefix or "").strip()
+        if not prefix:
+            return []
+        pattern = _like_prefix(prefix)
+
         try:
+            if not self.connection or not self.connection.is_connected():
+                self.connect()
+
             cursor = self.connection.cursor(dictionary=True)
-            query = "SELECT id, customer_name, contact_person_name, contact FROM customers"
-            cursor.execute(query)
-            return cursor.fetchall()
+            cursor.execute("""
+                (SELECT id, customer_name, contact_person_name, contact
+                 FROM customers WHERE customer_name LIKE %s
+                 ORDER BY customer_name LIMIT %s)
+                UNION
+                (SELECT id, customer_name, contact_person_name, contact
+                 FROM customers WHERE contact_person_name LIKE %s
+                 ORDER BY contact_person_name LIMIT %s)
+                ORDER BY customer_name, contact_person_name
+                LIMIT %s
+            """, (pattern, limit, pattern, limit, limit))
+            customers = cursor.fetchall()
+            cursor.close()
+            return customers
         except Exception as e:
-            print("Error fetching customers:", e)
+            print("Error searching customers:", e)
             return []
 
     def get_customer_by_id(self, customer_id):
-        """Fetch full customer info by ID."""
+        """Fetch full customer info by ID (O(1) lookup in the reference cache, returned as a copy)."""
+        return _copy_row(self._reference_data("customers")["by_id"].get(customer_id))
+
+    def warm_reference_cache(self):
+        """Load the product and customer lists into the shared cache if they are missing or stale."""
+        for name in REFERENCE_QUERIES:
+            self._reference_data(name)
+
+    def _reference_version(self, name):
+        """Version stamp of a reference list, read once per DatabaseConnection (i.e. per render)."""
+        if self._reference_versions is None:
+            try:
+                if not self.connection or not self.connection.is_connected():
+                    self.connect()
+                cursor = self.connection.cursor()
+                cursor.execute("SELECT name, version FROM reference_versions")
+                self._reference_versions = dict(cursor.fetchall())
+                cursor.close()
+            except Exception as e:
+                # Without version stamps nothing can be trusted from the cache
+                print("Error reading reference versions:", e)
+                return None
+        return self._reference_versions.get(name, 0)
+
+    def _reference_data(self, name):
+        version = self._reference_version(name)
+        entry = REFERENCE_CACHE.get(name, version)
+        if entry is not None:
+            return entry
+
         try:
             cursor = self.connection.cursor(dictionary=True)
-            query = """
-                SELECT customer_name, contact_person_name, contact 
-                FROM customers 
-                WHERE id = %s
-            """
-            cursor.execute(query, (customer_id,))  # Wrap in tuple!
-            return cursor.fetchone()  # This returns a dict like {'customer_name': ..., ...}
+            cursor.execute(REFERENCE_QUERIES[name][1])
+            rows = cursor.fetchall()
+            cursor.close()
         except Exception as e:
-            print("Error fetching customer by ID:", e)
-            return None
+            print(f"Error fetching {name}:", e)
+            return {"version": None, "rows": [], "by_id": {}, "by_barcode": None}
+
+        if version is None:
+            return {"version": None, "rows": rows, "by_id": {row[REFERENCE_QUERIES[name][0]]: row for row in rows},
+                    "by_barcode": None}
+        return REFERENCE_CACHE.put(name, version, rows)
+
+    def _bump_reference_version(self, cursor, name, invalidate=True):
+        """
+        Bump a reference list's version inside the caller's transaction so every process reloads it.
+        :param invalidate: Drop this process's cached copy now; callers that patch the cache
+                           with REFERENCE_CACHE.append() after committing pass False.
+        :return: The new version, or None if it could not be bumped.
+        """
+        version = None
+        try:
+            cursor.execute("""
+                INSERT INTO reference_versions (name, version) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1
+            """, (name,))
+            cursor.execute("SELECT version FROM reference_versions WHERE name = %s", (name,))
+            version = cursor.fetchone()[0]
+        except Error as e:
+            print(f"Error bumping {name} version:", e)
+        if invalidate or version is None:
+            REFERENCE_CACHE.invalidate(name)
+        self._reference_versions = None
+        return version
 
     def fetch_all_orders(self):
         """
@@ -614,27 +1712,23 @@ class DatabaseConnection:
             cursor = self.connection.cursor(dictionary=True)
 
             # Get all orders with customer details
-            cursor.execute("""
-                SELECT o.order_id, o.customer_id, c.customer_name, o.salesperson_name, o.total_amount, o.order_date, o.accounts_approval_status, o.director_approval_status,
-                o.loading_status FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.order_date DESC
-            """)
+            cursor.execute(ALL_ORDERS_SELECT + " ORDER BY o.order_date DESC")
             orders = cursor.fetchall()
 
             # Fetch and attach order items
-            for order in orders:
-                cursor.execute("""
-                    SELECT 
-                        id, product_id, product_name, quantity_ordered, 
-                        unit_price, total_price, loaded_quantity, loading_remarks
-                    FROM order_items
-                    WHERE order_id = %s
-                """, (order["order_id"],))
-                order["items"] = cursor.fetchall()
+            self._attach_items(cursor, orders, ALL_ORDERS_ITEM_SELECT)
 
             return orders
         except Exception as e:
             print("Error fetching all orders:", e)
             return []
+
+    def fetch_all_orders_page(self, after=None, before=None, page_size=ORDER_PAGE_SIZE):
+        """Keyset-paginated fetch_all_orders(); see _fetch_orders_page for the cursors."""
+        return self._fetch_orders_page("1 = 1", after, before, page_size, ALL_ORDERS_SELECT, ALL_ORDERS_ITEM_SELECT)
+
+    def count_all_orders(self):
+        return self._count_orders("1 = 1", "FROM orders o JOIN customers c ON o.customer_id = c.id")
         
         
         
@@ -642,29 +1736,41 @@ class DatabaseConnection:
   # ✅ Sample `log_stock_adjustment` method in conn.py
   
     def log_stock_adjustment(self, product_id, adjustment_type, quantity, reason, adjusted_by, previous_quantity, new_quantity):
-        try:
-            cursor = self.connection.cursor()
-            
+        """
+        Record a stock adjustment and apply it to products.qty under a row lock.
+        The adjustment is only saved if the locked stock still equals `previous_quantity`
+        (the figure the user counted against); if it moved in the meantime nothing is
+        written, so the user can re-count.
+        :return: True if saved, None if the stock moved since previous_quantity was read,
+                 False on error.
+        """
+        delta = float(quantity) if adjustment_type == "Increase" else -float(quantity)
+
+        def adjust(cursor):
+            cursor.execute("SELECT qty FROM products WHERE product_id = %s FOR UPDATE", (product_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Unknown product: {product_id}")
+            if round(float(row[0] or 0), 4) != round(float(previous_quantity), 4):
+                return None
+            previous, new = _apply_stock_deltas(cursor, {product_id: delta})[product_id]
+            _adjust_lots(cursor, product_id, delta)
+
             # Insert into the log table with previous and new quantity
-            query = """
+            cursor.execute("""
                 INSERT INTO stock_adjustments (
                     product_id, adjustment_type, quantity, reason, adjusted_by, previous_quantity, new_quantity, adjusted_at
                 ) VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-            """
-            cursor.execute(query, (
+            """, (
                 product_id, adjustment_type, quantity, reason,
-                adjusted_by, previous_quantity, new_quantity
+                adjusted_by, previous, new
             ))
-
-            # Update the stock to match the new quantity
-            update_query = "UPDATE products SET qty = %s WHERE product_id = %s"
-            cursor.execute(update_query, (new_quantity, product_id))
-
-            self.connection.commit()
             return True
+
+        try:
+            return self._run_stock_transaction(adjust)
         except Exception as e:
             print("Error logging stock adjustment:", e)
-            self.connection.rollback()
             return False
 
         
@@ -702,11 +1808,459 @@ class DatabaseConnection:
         
 
 
+    def get_stock_ledger(self, product_id, start=None, end=None, page=1, page_size=LEDGER_PAGE_SIZE):
+        """
+        Merged IN/OUT/ADJ ledger for a product with the running balance computed in SQL.
+        :param product_id: Product to build the ledger for.
+        :param start: First day (date or datetime) of the window; None means from the beginning.
+        :param end: Last day of the window, inclusive when a date; None means up to now.
+        :param page: 1-based page number within the window.
+        :param page_size: Rows per page.
+        :return: Dict with opening_balance (as of start), closing_balance, unit, rows,
+                 total_rows and signed totals per movement type for the whole window.
+        """
+        start = _as_datetime(start) or datetime(1970, 1, 1)
+        end = _as_datetime(end, end_of_day=True) or datetime(9999, 12, 31)
+        page = max(int(page), 1)
 
+        ledger = {
+            "opening_balance": 0.0, "closing_balance": 0.0, "unit": "",
+            "rows": [], "total_rows": 0, "page": page, "page_size": page_size,
+            "totals": {"IN": 0.0, "OUT": 0.0, "ADJ": 0.0},
+        }
 
+        try:
+            if not self.connection or not self.connection.is_connected():
+                self.connect()
 
+            cursor = self.connection.cursor(dictionary=True)
 
+            # Opening balance: opening qty plus every signed movement before the window
+            cursor.execute("""
+                SELECT
+                    p.opening_qty,
+                    p.unit_of_measure,
+                    (SELECT COALESCE(SUM(CASE WHEN movement_type = 'IN' THEN quantity ELSE -quantity END), 0)
+                       FROM stock_movements WHERE product_id = %s AND created_at < %s) AS moved,
+                    (SELECT COALESCE(SUM(CASE WHEN adjustment_type = 'Increase' THEN quantity ELSE -quantity END), 0)
+                       FROM stock_adjustments WHERE product_id = %s AND created_at < %s) AS adjusted
+                FROM products p
+                WHERE p.product_id = %s
+            """, (product_id, start, product_id, start, product_id))
+            info = cursor.fetchone()
+            if not info:
+                return ledger
+
+            opening = float(info["opening_qty"] or 0) + float(info["moved"]) + float(info["adjusted"])
+            ledger["opening_balance"] = opening
+            ledger["closing_balance"] = opening
+            ledger["unit"] = info["unit_of_measure"] or ""
 
+            cursor.execute("""
+                WITH entries AS (
+                    SELECT created_at, 0 AS source, id AS source_id, movement_type,
+                           CASE WHEN movement_type = 'IN' THEN quantity ELSE -quantity END AS quantity,
+                           reference, remarks
+                    FROM stock_movements
+                    WHERE product_id = %s AND created_at >= %s AND created_at < %s
+                    UNION ALL
+                    SELECT created_at, 1, id, 'ADJ',
+                           CASE WHEN adjustment_type = 'Increase' THEN quantity ELSE -quantity END,
+                           CONCAT('Adjusted by ', adjusted_by), reason
+                    FROM stock_adjustments
+                    WHERE product_id = %s AND created_at >= %s AND created_at < %s
+                )
+                SELECT
+                    created_at, movement_type, quantity, reference, remarks,
+                    %s + SUM(quantity) OVER (
+                        ORDER BY created_at, source, source_id
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                    ) AS running_balance,
+                    COUNT(*) OVER () AS total_rows,
+                    SUM(CASE WHEN movement_type = 'IN' THEN quantity ELSE 0 END) OVER () AS total_in,
+                    SUM(CASE WHEN movement_type = 'ADJ' THEN quantity ELSE 0 END) OVER () AS total_adj,
+                    SUM(CASE WHEN movement_type NOT IN ('IN', 'ADJ') THEN quantity ELSE 0 END) OVER () AS total_out
+                FROM entries
+                ORDER BY created_at, source, source_id
+                LIMIT %s OFFSET %s
+            """, (
+                product_id, start, end,
+                product_id, start, end,
+                opening, page_size, (page - 1) * page_size
+            ))
+            rows = cursor.fetchall()
+            cursor.close()
 
-
-
+            if rows:
+                first = rows[0]
+                ledger["total_rows"] = int(first["total_rows"])
+                ledger["totals"] = {
+                    "IN": float(first["total_in"]),
+                    "OUT": float(first["total_out"]),
+                    "ADJ": float(first["total_adj"]),
+                }
+                ledger["closing_balance"] = opening + sum(ledger["totals"].values())
+
+            ledger["rows"] = [{
+                "created_at": row["created_at"],
+                "movement_type": row["movement_type"],
+                "quantity": float(row["quantity"]),
+                "running_balance": float(row["running_balance"]),
+                "reference": row["reference"],
+                "remarks": row["remarks"],
+            } for row in rows]
+            return ledger
+        except Exception as e:
+            print("Error fetching stock ledger:", e)
+            return ledger
+
+
+def _case_update(cursor, table, key_column, columns, rows):
+    """
+    Update many rows with one statement per BULK_INSERT_CHUNK rows:
+    UPDATE table SET col = CASE key WHEN ... THEN ... END, ... WHERE key IN (...).
+    :param rows: Tuples of (key, value for each of `columns`).
+    """
+    for start in range(0, len(rows), BULK_INSERT_CHUNK):
+        chunk = rows[start:start + BULK_INSERT_CHUNK]
+        assignments, params = [], []
+        for position, column in enumerate(columns, start=1):
+            whens = " ".join(["WHEN %s THEN %s"] * len(chunk))
+            assignments.append(f"{column} = CASE {key_column} {whens} END")
+            params.extend(value for row in chunk for value in (row[0], row[position]))
+        keys = [row[0] for row in chunk]
+        params.extend(keys)
+        cursor.execute(
+            f"UPDATE {table} SET {', '.join(assignments)} WHERE {key_column} IN ({', '.join(['%s'] * len(keys))})",
+            tuple(params)
+        )
+
+
+def _apply_stock_deltas(cursor, deltas):
+    """
+    Lock the affected products rows (SELECT ... FOR UPDATE, in product_id order so
+    concurrent transactions cannot deadlock on each other) and apply the deltas.
+    :param deltas: {product_id: signed quantity}.
+    :return: {product_id: (previous_qty, new_qty)} as seen under the lock.
+    """
+    product_ids = sorted(deltas)
+    if not product_ids:
+        return {}
+
+    locked = {}
+    for start in range(0, len(product_ids), BULK_INSERT_CHUNK):
+        chunk = product_ids[start:start + BULK_INSERT_CHUNK]
+        cursor.execute(
+            f"SELECT product_id, qty FROM products WHERE product_id IN ({', '.join(['%s'] * len(chunk))}) "
+            f"ORDER BY product_id FOR UPDATE",
+            tuple(chunk)
+        )
+        locked.update((pid, float(qty or 0)) for pid, qty in cursor.fetchall())
+
+    missing = set(product_ids) - set(locked)
+    if missing:
+        raise ValueError(f"Unknown product(s): {sorted(missing)}")
+
+    _add_to_stock(cursor, deltas)
+    return {pid: (locked[pid], locked[pid] + deltas[pid]) for pid in product_ids}
+
+
+def _add_to_stock(cursor, deltas):
+    """Apply signed quantity deltas ({product_id: delta}) to products.qty in batched statements."""
+    rows = [(product_id, delta) for product_id, delta in deltas.items() if delta]
+    for start in range(0, len(rows), BULK_INSERT_CHUNK):
+        chunk = rows[start:start + BULK_INSERT_CHUNK]
+        whens = " ".join(["WHEN %s THEN %s"] * len(chunk))
+        params = [value for row in chunk for value in row] + [row[0] for row in chunk]
+        cursor.execute(
+            f"UPDATE products SET qty = qty + CASE product_id {whens} END "
+            f"WHERE product_id IN ({', '.join(['%s'] * len(chunk))})",
+            tuple(params)
+        )
+
+
+def _insert_stock_movements(cursor, movements):
+    """Insert (product_id, movement_type, quantity, reference, remarks, batch_number) rows with batched executemany."""
+    query = """
+        INSERT INTO stock_movements (product_id, movement_type, quantity, reference, remarks, batch_number)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    for start in range(0, len(movements), BULK_INSERT_CHUNK):
+        cursor.executemany(query, movements[start:start + BULK_INSERT_CHUNK])
+
+
+class FefoAllocator:
+    """
+    First-expiry-first-out allocation over locked stock lots. Each product has a heap
+    keyed on (no expiry date, expiration_date, lot id), so a draw-down only touches
+    the lots it consumes however many lots the product has.
+    """
+
+    def __init__(self, lots):
+        """:param lots: (lot id, product_id, batch_number, expiration_date, qty) rows."""
+        self._heaps = {}
+        self._remaining = {}
+        self._changed = set()
+        for lot_id, product_id, batch_number, expiration_date, qty in lots:
+            self._remaining[lot_id] = float(qty)
+            # Lots without an expiry date go last
+            key = (expiration_date is None, expiration_date or date.max, lot_id, batch_number)
+            self._heaps.setdefault(product_id, []).append(key)
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    def allocate(self, product_id, qty):
+        """
+        Draw `qty` of a product from its earliest-expiring lots.
+        :return: (list of (lot id, batch_number, quantity taken), quantity no lot could cover)
+        """
+        heap = self._heaps.get(product_id, [])
+        picks = []
+        while qty > LOT_EPSILON and heap:
+            _, _, lot_id, batch_number = heap[0]
+            take = min(self._remaining[lot_id], qty)
+            self._remaining[lot_id] = round(self._remaining[lot_id] - take, 6)
+            self._changed.add(lot_id)
+            qty = round(qty - take, 6)
+            picks.append((lot_id, batch_number, take))
+            if self._remaining[lot_id] <= LOT_EPSILON:
+                heapq.heappop(heap)
+        return picks, max(qty, 0.0)
+
+    def lot_updates(self):
+        """(lot id, remaining qty) for every lot drawn from, for _case_update."""
+        return [(lot_id, self._remaining[lot_id]) for lot_id in sorted(self._changed)]
+
+
+def _receive_lots(cursor, lots):
+    """Insert (product_id, batch_number, expiration_date, qty) stock lots with batched executemany."""
+    query = """
+        INSERT INTO stock_lots (product_id, batch_number, expiration_date, qty)
+        VALUES (%s, %s, %s, %s)
+    """
+    lots = [lot for lot in lots if float(lot[3]) > 0]
+    for start in range(0, len(lots), BULK_INSERT_CHUNK):
+        cursor.executemany(query, lots[start:start + BULK_INSERT_CHUNK])
+
+
+def _lock_fefo_lots(cursor, product_id, qty):
+    """
+    Lock a product's open lots in FEFO order, LOT_BATCH_SIZE at a time along
+    idx_stock_lots_fefo, until they cover `qty` or run out. Dated lots come first,
+    then lots without an expiry date (which the index sorts first).
+    :return: (lot id, product_id, batch_number, expiration_date, qty) rows.
+    """
+    lots = []
+    covered = 0.0
+    for dated in (True, False):
+        after = None
+        while covered < qty - LOT_EPSILON:
+            if dated:
+                where = "expiration_date IS NOT NULL"
+                keyset = " AND (expiration_date > %s OR (expiration_date = %s AND id > %s))" if after else ""
+                params = [after[3], after[3], after[0]] if after else []
+            else:
+                where = "expiration_date IS NULL"
+                keyset = " AND id > %s" if after else ""
+                params = [after[0]] if after else []
+            cursor.execute(
+                f"SELECT id, product_id, batch_number, expiration_date, qty FROM stock_lots "
+                f"WHERE product_id = %s AND {where}{keyset} AND qty > 0 "
+                f"ORDER BY expiration_date, id LIMIT %s FOR UPDATE",
+                tuple([product_id] + params + [LOT_BATCH_SIZE])
+            )
+            batch = cursor.fetchall()
+            lots.extend(batch)
+            covered += sum(float(lot[4]) for lot in batch)
+            if len(batch) < LOT_BATCH_SIZE:
+                break
+            after = batch[-1]
+    return lots
+
+
+def _draw_down_lots(cursor, demands, movement_type='OUT'):
+    """
+    Lock just enough of the products' lots (after their products rows, like every
+    stock transaction) and allocate each demand FEFO. Lots drawn to zero are
+    deleted, so the FEFO reads never wade through emptied lots; their batches
+    stay on the stock movements.
+    :param demands: (product_id, qty, reference, remarks) in allocation order.
+    :return: Movement rows for _insert_stock_movements, one per lot drawn from; a
+             quantity no lot covers is recorded with batch_number NULL.
+    """
+    needed = {}
+    for product_id, qty, _, _ in demands:
+        needed[product_id] = needed.get(product_id, 0.0) + float(qty)
+    lots = []
+    for product_id in sorted(needed):
+        lots.extend(_lock_fefo_lots(cursor, product_id, needed[product_id]))
+
+    allocator = FefoAllocator(lots)
+    movements = []
+    for product_id, qty, reference, remarks in demands:
+        picks, uncovered = allocator.allocate(product_id, float(qty))
+        movements.extend((product_id, movement_type, taken, reference, remarks, batch_number)
+                         for _, batch_number, taken in picks)
+        if uncovered > LOT_EPSILON:
+            movements.append((product_id, movement_type, uncovered, reference, remarks, None))
+
+    updates = allocator.lot_updates()
+    _case_update(cursor, "stock_lots", "id", ("qty",), [row for row in updates if row[1] > LOT_EPSILON])
+    emptied = [lot_id for lot_id, remaining in updates if remaining <= LOT_EPSILON]
+    for start in range(0, len(emptied), BULK_INSERT_CHUNK):
+        chunk = emptied[start:start + BULK_INSERT_CHUNK]
+        cursor.execute(f"DELETE FROM stock_lots WHERE id IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+    return movements
+
+
+def _adjust_lots(cursor, product_id, delta):
+    """Mirror a single stock delta on the lots: a new unbatched lot, or a FEFO draw-down."""
+    if delta > 0:
+        _receive_lots(cursor, [(product_id, None, None, delta)])
+    elif delta < 0:
+        _draw_down_lots(cursor, [(product_id, -delta, None, None)])
+
+
+def read_grn_chunks(file, file_name=None, chunk_size=GRN_CHUNK_SIZE):
+    """
+    Stream a GRN CSV or XLSX upload as DataFrame chunks of `chunk_size` rows,
+    so large files never have to be loaded whole.
+    """
+    file_name = file_name or getattr(file, "name", "")
+    if file_name.lower().endswith(".csv"):
+        yield from pd.read_csv(file, chunksize=chunk_size)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet_rows = workbook.active.iter_rows(values_only=True)
+        header = [str(col).strip() if col is not None else "" for col in next(sheet_rows, ())]
+        batch = []
+        for row in sheet_rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _frame_from_rows(rows, names, kinds, dtypes=None):
+    """
+    DataFrame from tuple rows, one numpy array per column.
+    :param kinds: (MySQL field type, nullable) per column, from cursor.description.
+    """
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    data = {}
+    for name, column, (field_type, nullable) in zip(names, values, kinds):
+        if field_type in FLOAT_FIELD_TYPES:
+            # Decimal -> float and None -> NaN in one C-level conversion
+            data[name] = np.array(column, dtype="float64")
+        elif field_type in DATETIME_FIELD_TYPES:
+            data[name] = pd.to_datetime(column).as_unit("ns").to_numpy()
+        elif field_type in INT_FIELD_TYPES:
+            data[name] = pd.array(column, dtype="Int64") if nullable else np.array(column, dtype="int64")
+        else:
+            data[name] = np.array(column, dtype=object)
+    frame = pd.DataFrame(data, copy=False)
+    return frame.astype(dtypes) if dtypes else frame
+
+
+def _build_search_index(version, rows):
+    """
+    Start building a ProductSearchIndex of products `version` (whose cached rows are
+    `rows`) in a daemon thread, unless that version or a newer one is already building.
+    """
+    with _search_lock:
+        building = _search_index["building"]
+        if building is not None and building >= version:
+            return
+        _search_index["building"] = version
+        _search_index["appended"] = []
+
+    def build():
+        try:
+            index = ProductSearchIndex(rows)
+        except Exception as e:
+            print("Error building product search index:", e)
+            index = None
+        with _search_lock:
+            # A newer version started building meanwhile: this index is already stale
+            if _search_index["building"] != version:
+                return
+            _search_index["building"] = None
+            if index is None:
+                return
+            installed = version
+            for installed, row in _search_index["appended"]:
+                index.add(row)
+            _search_index.update(index=index, version=installed, appended=[])
+
+    threading.Thread(target=build, name="product-search-index", daemon=True).start()
+
+
+def _add_to_search_index(version, product):
+    """
+    Add a product committed at products `version` to the search index, and queue it for
+    the build in progress, as long as each has every version before it.
+    """
+    with _search_lock:
+        index = _search_index["index"]
+        if index is not None and _search_index["version"] == version - 1:
+            index.add(product)
+            _search_index["version"] = version
+        building = _search_index["building"]
+        if building is not None:
+            appended = _search_index["appended"]
+            if building + len(appended) == version - 1:
+                appended.append((version, product))
+            else:
+                # Missed a version: the build can no longer be brought up to date
+                _search_index["building"] = None
+
+
+def _copy_row(row):
+    """Copy of a cached reference row, so callers cannot change what other sessions see."""
+    return dict(row) if row is not None else None
+
+
+def _index_barcode(by_barcode, product):
+    """Add a product to a barcode -> product map; the first product keeps a shared barcode."""
+    barcode = str(product.get("barcode") or "").strip()
+    if barcode:
+        by_barcode.setdefault(barcode, product)
+
+
+def _like_prefix(text):
+    """LIKE pattern matching values that start with `text`, with its wildcards escaped."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _text_column(series):
+    """Strip a column to nullable strings; floats that are whole numbers (e.g. barcodes read by read_csv) lose the '.0'."""
+    if pd.api.types.is_float_dtype(series):
+        whole = series.notna() & (series % 1 == 0)
+        series = series.astype(object).where(~whole, series[whole].astype("int64").astype(str))
+    text = series.astype("string").str.strip()
+    return text.mask(text == "")
+
+
+def _nullable(series):
+    """Column values as a Python list with NaN/NA replaced by None (for DB parameters)."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _as_datetime(value, end_of_day=False):
+    """Turn a date into a datetime bound; with end_of_day, the exclusive midnight after it."""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        value = datetime.combine(value, datetime.min.time())
+        return value + timedelta(days=1) if end_of_day else value
+    return value
@@ -0,0 +1,105 @@
+"""
+Streaming CSV exports.
+
+Rows are read with DatabaseConnection.stream_query() and written as they
+arrive, so memory stays flat however many rows an export covers:
+
+    python exports.py orders --start 2025-01-01 --end 2025-12-31 --out orders.csv
+    python exports.py stock_movements --out - | gzip > movements.csv.gz
+
+Dates are inclusive; without --start/--end the whole table is exported.
+"""
+import csv
+import sys
+from datetime import date, datetime, timedelta
+
+# name: (table alias `t` FROM clause, date column used for --start/--end, exported columns)
+EXPORTS = {
+    "orders": ("orders t", "t.order_date", [
+        "order_id", "customer_id", "salesperson_name", "total_amount", "order_date", "payment_terms",
+        "accounts_approval_status", "accounts_remarks", "director_approval_status", "director_remarks",
+        "loading_status", "loading_remarks",
+    ]),
+    "order_items": ("order_items t JOIN orders o ON o.order_id = t.order_id", "o.order_date", [
+        "id", "order_id", "product_id", "product_name", "quantity_ordered", "unit_price",
+        "total_price", "loaded_quantity", "loading_remarks",
+    ]),
+    "stock_movements": ("stock_movements t", "t.created_at", [
+        "id", "product_id", "movement_type", "quantity", "batch_number", "reference", "remarks", "created_at",
+    ]),
+    "grn_items": ("grn_items t", "t.created_at", [
+        "id", "grn_id", "product_id", "ordered_qty", "received_qty", "verified_qty",
+        "discrepancy", "remarks", "created_at",
+    ]),
+}
+
+
+def _bound(value, end=False):
+    """Date (inclusive) or datetime to a datetime bound; a date `end` becomes the next midnight."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time()) + (timedelta(days=1) if end else timedelta())
+    return value
+
+
+def export_query(name, start=None, end=None):
+    """
+    SQL, params and header for one export, in date order.
+    :param name: Key of EXPORTS.
+    :return: (sql, params, columns)
+    """
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export '{name}', expected one of {sorted(EXPORTS)}")
+    source, date_column, columns = EXPORTS[name]
+
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{date_column} >= %s")
+        params.append(_bound(start))
+    if end is not None:
+        clauses.append(f"{date_column} < %s")
+        params.append(_bound(end, end=True))
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+    sql = f"SELECT {', '.join('t.' + c for c in columns)} FROM {source} {where} ORDER BY {date_column}, t.{columns[0]}"
+    return sql, params, columns
+
+
+def write_csv(db, name, out, start=None, end=None):
+    """
+    Stream one export into a text file object.
+    :param db: DatabaseConnection (only its credentials are used; rows come over a dedicated connection).
+    :param name: Key of EXPORTS.
+    :param out: Writable text file, opened with newline="".
+    :return: Number of data rows written.
+    """
+    sql, params, columns = export_query(name, start, end)
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for row in db.stream_query(sql, params):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    from conn import DatabaseConnection
+
+    parser = argparse.ArgumentParser(description="Stream a table to CSV.")
+    parser.add_argument("export", choices=sorted(EXPORTS))
+    parser.add_argument("--start", help="First day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--end", help="Last day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--out", default="-", help="Output file, or - for stdout")
+    args = parser.parse_args()
+
+    db = DatabaseConnection(pooled=False)
+    out = sys.stdout if args.out == "-" else open(args.out, "w", newline="", encoding="utf-8")
+    try:
+        rows = write_csv(db, args.export, out, args.start, args.end)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Exported {rows} {args.export} rows.", file=sys.stderr)
@@ -0,0 +1,338 @@
+"""
+Query instrumentation for DatabaseConnection.
+
+Every DatabaseConnection method call and every SQL statement executed through
+`db.connection.cursor()` is timed into process-wide latency histograms (STATS).
+Each DatabaseConnection also carries a RenderStats with the query count, rows
+and time of the page render that created it. Statements slower than
+SLOW_QUERY_MS are printed to the log.
+
+    from instrumentation import STATS
+    STATS.snapshot()["methods"]["fetch_pending_orders"]["count"]
+"""
+import functools
+import inspect
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+
+ENABLED = os.getenv("DB_INSTRUMENTATION", "1") != "0"
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Number of recent page renders kept for the admin panel
+RECENT_RENDERS = 50
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+# A list of placeholder tuples, e.g. (customer_name, contact) IN ((%s, %s), (%s, %s)), after
+# _PLACEHOLDER_LIST has collapsed each tuple
+_TUPLE_LIST = re.compile(r"\(\s*(\(%s(?:, \.\.\.)?\))(?:\s*,\s*\1)+\s*\)")
+# CASE key WHEN %s THEN %s WHEN %s THEN %s ... from the batched UPDATEs
+_WHEN_RUN = re.compile(r"WHEN %s THEN %s(?: WHEN %s THEN %s)+", re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """
+    Collapse whitespace, IN (%s, %s, ...) lists, lists of placeholder tuples and
+    runs of WHEN %s THEN %s, so batched queries of any size share one short key.
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _PLACEHOLDER_LIST.sub("(%s, ...)", sql)
+    sql = _TUPLE_LIST.sub(r"(\1, ...)", sql)
+    return _WHEN_RUN.sub("WHEN %s THEN %s ...", sql)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets plus running totals."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.fetch_ms = 0.0
+        self.errors = 0
+
+    def observe(self, ms):
+        index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "fetch_ms": round(self.fetch_ms, 3),
+            "errors": self.errors,
+            "buckets": dict(zip([f"<={b}" for b in LATENCY_BUCKETS_MS] + ["inf"], self.buckets)),
+        }
+
+
+class RenderStats:
+    """Query counters for a single DatabaseConnection, i.e. one page render."""
+
+    def __init__(self, page=""):
+        self.page = page
+        self.started_at = time.time()
+        self.queries = 0
+        self.rows = 0
+        self.query_ms = 0.0
+        self.method_calls = Counter()
+        self.method_stack = []
+
+    @property
+    def current_method(self):
+        return self.method_stack[-1] if self.method_stack else "<direct>"
+
+    def as_dict(self):
+        return {
+            "page": self.page,
+            "started_at": self.started_at,
+            "queries": self.queries,
+            "rows": self.rows,
+            "query_ms": round(self.query_ms, 3),
+            "method_calls": dict(self.method_calls),
+        }
+
+
+class QueryStats:
+    """Process-wide latency histograms keyed by DatabaseConnection method and by SQL statement."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.methods = {}
+            self.statements = {}
+            self.slow_queries = deque(maxlen=100)
+            self.renders = deque(maxlen=RECENT_RENDERS)
+
+    def record_method(self, name, ms):
+        with self._lock:
+            self.methods.setdefault(name, Histogram()).observe(ms)
+
+    def record_statement(self, sql, ms, rows=0, failed=False, method=""):
+        with self._lock:
+            histogram = self.statements.setdefault(sql, Histogram())
+            histogram.observe(ms)
+            histogram.rows += rows
+            if failed:
+                histogram.errors += 1
+            if ms >= SLOW_QUERY_MS:
+                self.slow_queries.append({"sql": sql, "ms": round(ms, 3), "method": method, "at": time.time()})
+        if ms >= SLOW_QUERY_MS:
+            print(f"Slow query ({ms:.1f} ms) in {method}: {sql}")
+
+    def record_fetch(self, sql, ms, rows):
+        with self._lock:
+            histogram = self.statements.setdefault(sql, Histogram())
+            histogram.fetch_ms += ms
+            histogram.rows += rows
+
+    def track_render(self, render_stats):
+        with self._lock:
+            self.renders.append(render_stats)
+
+    def snapshot(self):
+        """Plain-dict copy of all counters, safe to inspect or assert on."""
+        with self._lock:
+            return {
+                "methods": {name: h.as_dict() for name, h in self.methods.items()},
+                "statements": {sql: h.as_dict() for sql, h in self.statements.items()},
+                "slow_queries": list(self.slow_queries),
+                "renders": [r.as_dict() for r in self.renders],
+            }
+
+
+STATS = QueryStats()
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute calls and counts fetched rows."""
+
+    def __init__(self, cursor, render_stats):
+        self._cursor = cursor
+        self._render = render_stats
+        self._sql = None
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, **kwargs)
+
+    def _timed(self, call, operation, *args, **kwargs):
+        self._sql = normalize_sql(operation)
+        failed = True
+        start = time.perf_counter()
+        try:
+            result = call(operation, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            rows = 0
+            if not failed and not getattr(self._cursor, "with_rows", True):
+                rows = max(self._cursor.rowcount or 0, 0)
+            self._render.queries += 1
+            self._render.rows += rows
+            self._render.query_ms += ms
+            STATS.record_statement(self._sql, ms, rows, failed, self._render.current_method)
+
+    def _fetched(self, start, rows):
+        ms = (time.perf_counter() - start) * 1000
+        self._render.rows += rows
+        self._render.query_ms += ms
+        if self._sql is not None:
+            STATS.record_fetch(self._sql, ms, rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented; everything else is passed through."""
+
+    def __init__(self, connection, render_stats):
+        self._connection = connection
+        self._render = render_stats
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._render)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def instrument_connection(connection, render_stats):
+    if not ENABLED or connection is None:
+        return connection
+    return InstrumentedConnection(connection, render_stats)
+
+
+def unwrap_connection(connection):
+    return connection._connection if isinstance(connection, InstrumentedConnection) else connection
+
+
+def instrument_methods(cls):
+    """Class decorator timing every public method into STATS and the instance's render_stats."""
+    if not ENABLED:
+        return cls
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(attr):
+            continue
+        setattr(cls, name, _timed_method(name, attr))
+    return cls
+
+
+def _timed_method(name, func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        render = self.render_stats
+        render.method_stack.append(name)
+        render.method_calls[name] += 1
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(self, *args, **kwargs)
+        finally:
+            render.method_stack.pop()
+            elapsed = time.perf_counter() - start
+            if not inspect.isgenerator(result):
+                STATS.record_method(name, elapsed * 1000)
+        if inspect.isgenerator(result):
+            return _timed_generator(name, render, result, elapsed)
+        return result
+    return wrapper
+
+
+def _timed_generator(name, render, generator, elapsed):
+    """
+    Re-enter the method around every step of a generator it returned (stream_query,
+    chunked query_df), so the statements it runs while being consumed are charged
+    to it. Its time is recorded once it is exhausted or closed.
+    """
+    def step(call):
+        nonlocal elapsed
+        render.method_stack.append(name)
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            render.method_stack.pop()
+            elapsed += time.perf_counter() - start
+
+    try:
+        while True:
+            try:
+                item = step(lambda: next(generator))
+            except StopIteration:
+                return
+            yield item
+    finally:
+        step(generator.close)
+        STATS.record_method(name, elapsed * 1000)
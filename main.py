@@ -17,10 +17,6 @@ if st.session_state["authenticated"]:
     menu()
 
 
-# Fetch pending approvals
-pending_orders = db.fetch_pending_orders()
-pending_count = len(pending_orders)
-
 #st.image("logo.png", width=300) 
 st.markdown("## 📊 Dashboard")
 
@@ -28,10 +24,14 @@ st.markdown("## 📊 Dashboard")
 # Proper role check
 role = st.session_state.get("role", "")
 
-# Example counts from your database
-accounts_pending = db.count_pending_approvals_for_accounts()
-director_pending = db.count_pending_approvals_for_director()
-loading_pending = db.count_pending_for_loading()
+# Warm the shared product/customer cache (a single version check when it is already fresh)
+db.warm_reference_cache()
+
+# Workflow counters (one cached query shared across sessions)
+counts = db.dashboard_counts()
+accounts_pending = counts["accounts_pending"]
+director_pending = counts["director_pending"]
+loading_pending = counts["loading_pending"]
 
 # Shared card-rendering function
 def approval_card(title, count, color, target_page, button_key):
@@ -1,4 +1,5 @@
 import streamlit as st
+from instrumentation import STATS
 
 def menu():
     #st.sidebar.image("logo.png", width=200) 
@@ -74,7 +75,37 @@ def menu():
 
     st.sidebar.divider()
 
+    if role == "admin" and st.sidebar.toggle("🩺 Query Stats"):
+        query_stats_panel()
+
     if st.sidebar.button("🚪 Logout"):
         st.session_state.clear()
         st.success("Logged out successfully!")
-        st.switch_page("pages/login.py")
\ No newline at end of file
+        st.switch_page("pages/login.py")
+
+
+def query_stats_panel():
+    """Admin-only sidebar view of the database instrumentation counters."""
+    snapshot = STATS.snapshot()
+
+    with st.sidebar.expander("Recent page renders", expanded=True):
+        renders = [
+            {"Page": r["page"], "Queries": r["queries"], "Rows": r["rows"], "DB ms": r["query_ms"]}
+            for r in reversed(snapshot["renders"])
+        ]
+        st.dataframe(renders, use_container_width=True, hide_index=True)
+
+    with st.sidebar.expander("Slowest methods"):
+        methods = sorted(snapshot["methods"].items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+        st.dataframe([
+            {"Method": name, "Calls": h["count"], "Avg ms": h["avg_ms"], "p95 ms": h["p95_ms"], "Total ms": h["total_ms"]}
+            for name, h in methods[:15]
+        ], use_container_width=True, hide_index=True)
+
+    with st.sidebar.expander("Slow queries"):
+        if snapshot["slow_queries"]:
+            for q in reversed(snapshot["slow_queries"][-10:]):
+                st.caption(f"{q['ms']} ms · {q['method']}")
+                st.code(q["sql"], language="sql")
+        else:
+            st.caption("No slow queries recorded.")
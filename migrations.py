@@ -0,0 +1,177 @@
+"""
+Versioned schema migrations for the rajchemsales database.
+
+Each migration is (version, description, statements). Applied versions are
+recorded in `schema_migrations`, so running this again only applies new ones:
+
+    python migrations.py
+"""
+from mysql.connector import Error
+from conn import DatabaseConnection
+
+# MySQL errors that mean a statement was already applied (duplicate column / duplicate index name),
+# which lets a migration that failed half-way be re-run.
+ALREADY_APPLIED_ERRORS = {1060, 1061}
+
+MIGRATIONS = [
+    (1, "Indexes for order workflow, ledger, GRN and customer lookups", [
+        # Order lists filter on one workflow status and sort by date
+        "CREATE INDEX idx_orders_accounts_status ON orders (accounts_approval_status, order_date)",
+        "CREATE INDEX idx_orders_director_status ON orders (director_approval_status, loading_status, order_date)",
+        "CREATE INDEX idx_orders_loading_status ON orders (loading_status, order_date)",
+        "CREATE INDEX idx_orders_order_date ON orders (order_date, order_id)",
+        # Batched item loading (WHERE order_id IN (...) ORDER BY order_id, id)
+        "CREATE INDEX idx_order_items_order ON order_items (order_id, id)",
+        # Stock ledger and movement lookups per product in date order
+        "CREATE INDEX idx_stock_movements_product_date ON stock_movements (product_id, created_at)",
+        "CREATE INDEX idx_stock_adjustments_product_date ON stock_adjustments (product_id, created_at)",
+        "CREATE INDEX idx_grn_items_grn ON grn_items (grn_id)",
+        "CREATE INDEX idx_grn_items_product_date ON grn_items (product_id, created_at)",
+        # Duplicate-customer checks
+        "CREATE INDEX idx_customers_name_contact ON customers (customer_name, contact)",
+    ]),
+    (2, "Daily sales rollups with an orders.updated_at watermark", [
+        """ALTER TABLE orders ADD COLUMN updated_at TIMESTAMP NOT NULL
+               DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP""",
+        "CREATE INDEX idx_orders_updated_at ON orders (updated_at)",
+        """CREATE TABLE IF NOT EXISTS daily_product_sales (
+               sale_date DATE NOT NULL,
+               salesperson_name VARCHAR(255) NOT NULL,
+               product_name VARCHAR(255) NOT NULL,
+               quantity DECIMAL(20, 4) NOT NULL,
+               sales DECIMAL(20, 4) NOT NULL,
+               PRIMARY KEY (sale_date, salesperson_name, product_name)
+           )""",
+        """CREATE TABLE IF NOT EXISTS daily_customer_sales (
+               sale_date DATE NOT NULL,
+               salesperson_name VARCHAR(255) NOT NULL,
+               customer_id INT NOT NULL,
+               orders INT NOT NULL,
+               sales DECIMAL(20, 4) NOT NULL,
+               PRIMARY KEY (sale_date, salesperson_name, customer_id)
+           )""",
+        """CREATE TABLE IF NOT EXISTS daily_salesperson_sales (
+               sale_date DATE NOT NULL,
+               salesperson_name VARCHAR(255) NOT NULL,
+               orders INT NOT NULL,
+               sales DECIMAL(20, 4) NOT NULL,
+               PRIMARY KEY (sale_date, salesperson_name)
+           )""",
+        """CREATE TABLE IF NOT EXISTS rollup_state (
+               name VARCHAR(64) PRIMARY KEY,
+               changed_through TIMESTAMP NULL,
+               rolled_through DATE NULL
+           )""",
+    ]),
+    (3, "Version stamps for cached reference data", [
+        """CREATE TABLE IF NOT EXISTS reference_versions (
+               name VARCHAR(32) PRIMARY KEY,
+               version BIGINT NOT NULL DEFAULT 0
+           )""",
+        "INSERT IGNORE INTO reference_versions (name, version) VALUES ('products', 0), ('customers', 0)",
+    ]),
+    (4, "Order ID sequence for ORDER_ID_GENERATOR=sequence", [
+        """CREATE TABLE IF NOT EXISTS order_id_sequences (
+               name VARCHAR(32) PRIMARY KEY,
+               value BIGINT UNSIGNED NOT NULL DEFAULT 0
+           )""",
+        "INSERT IGNORE INTO order_id_sequences (name, value) VALUES ('orders', 0)",
+    ]),
+    (5, "Index for customer-filtered loading history", [
+        "CREATE INDEX idx_orders_customer_loading ON orders (customer_id, loading_status, order_date, order_id)",
+    ]),
+    # customer_name prefixes already use idx_customers_name_contact from migration 1
+    (6, "Index for customer typeahead on contact person", [
+        "CREATE INDEX idx_customers_contact_person ON customers (contact_person_name)",
+    ]),
+    (7, "Per-batch stock lots for FEFO allocation", [
+        """CREATE TABLE IF NOT EXISTS stock_lots (
+               id INT AUTO_INCREMENT PRIMARY KEY,
+               product_id INT NOT NULL,
+               batch_number VARCHAR(255) NULL,
+               expiration_date DATE NULL,
+               qty DECIMAL(20, 4) NOT NULL,
+               created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               KEY idx_stock_lots_fefo (product_id, expiration_date, id)
+           )""",
+        "ALTER TABLE stock_movements ADD COLUMN batch_number VARCHAR(255) NULL",
+        # Current stock becomes each product's first lot, under the batch/expiry recorded on the product
+        """INSERT INTO stock_lots (product_id, batch_number, expiration_date, qty)
+           SELECT p.product_id, p.batch_number, p.expiration_date, p.qty
+           FROM products p
+           WHERE p.qty > 0
+             AND NOT EXISTS (SELECT 1 FROM stock_lots l WHERE l.product_id = p.product_id)""",
+    ]),
+    (8, "Indexes for reviewed orders, salesperson filters and dated exports", [
+        # Last branch of REVIEWED_ORDERS_WHERE (director decided, accounts not), covering for the count
+        "CREATE INDEX idx_orders_director_accounts ON orders (director_approval_status, accounts_approval_status, order_date)",
+        # The Reports salesperson list (SELECT DISTINCT salesperson_name) and salesperson-filtered report queries
+        "CREATE INDEX idx_orders_salesperson_date ON orders (salesperson_name, order_date)",
+        # exports.py reads these tables by date alone
+        "CREATE INDEX idx_stock_movements_created ON stock_movements (created_at)",
+        "CREATE INDEX idx_grn_items_created ON grn_items (created_at)",
+    ]),
+    (9, "Drop emptied stock lots", [
+        # Lots are now deleted when drawn to zero; older empty ones would sit at the head of every FEFO read
+        "DELETE FROM stock_lots WHERE qty <= 0",
+    ]),
+]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(db):
+    """
+    Apply every migration that has not been recorded yet, in version order.
+    :param db: Connected DatabaseConnection.
+    :return: List of versions applied by this run.
+    """
+    cursor = db.connection.cursor()
+    ensure_migrations_table(cursor)
+    done = applied_versions(cursor)
+    applied = []
+
+    for version, description, statements in sorted(MIGRATIONS):
+        if version in done:
+            continue
+        for statement in statements:
+            try:
+                cursor.execute(statement)
+            except Error as e:
+                if e.errno not in ALREADY_APPLIED_ERRORS:
+                    raise
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+            (version, description)
+        )
+        db.connection.commit()
+        applied.append(version)
+        print(f"Applied migration {version}: {description}")
+
+    cursor.close()
+    return applied
+
+
+if __name__ == "__main__":
+    db = DatabaseConnection(pooled=False)
+    db.connect()
+    if not db.connection:
+        raise SystemExit("Could not connect to the database.")
+    try:
+        if not migrate(db):
+            print("Schema is up to date.")
+    finally:
+        db.disconnect()
@@ -0,0 +1,205 @@
+"""
+Order ID generation.
+
+Order IDs keep the `ORD-` prefix followed by 13 base-36 characters. Two
+backends are available, picked with the ORDER_ID_GENERATOR environment
+variable:
+
+- "snowflake": 41 bits of milliseconds since ORDER_ID_EPOCH, 10 bits of node
+  id and a 12-bit per-millisecond counter. No database round trip; IDs are
+  unique across processes and hosts because every process must be given its
+  own node id in ORDER_ID_NODE (0-1023). There is no derived default: a hash
+  of host and pid can give two processes the same node id.
+- "sequence": values handed out by the `order_id_sequences` table (see
+  migration 4), strictly increasing across every writer.
+
+The default, "auto", uses snowflake when ORDER_ID_NODE is set and the
+sequence otherwise.
+
+Both keep IDs increasing in creation order and shorter than the legacy
+`ORD-YYYYmmddHHMMSS` IDs, so they fit the existing orders.order_id column.
+
+    from order_ids import next_order_id
+    order_id = next_order_id(db)
+
+Throughput check across processes:
+
+    python order_ids.py bench --processes 4 --count 50000
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+ORDER_ID_PREFIX = "ORD-"
+ORDER_ID_WIDTH = 13  # 36 ** 13 > 2 ** 64
+ORDER_ID_GENERATOR = os.getenv("ORDER_ID_GENERATOR", "auto")
+
+# Snowflake layout: | 41 bits ms since epoch | 10 bits node | 12 bits counter |
+ORDER_ID_EPOCH = datetime(2024, 1, 1)
+NODE_BITS = 10
+COUNTER_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_COUNTER = (1 << COUNTER_BITS) - 1
+
+ORDER_SEQUENCE_NAME = "orders"
+
+_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def format_order_id(value):
+    """Render a non-negative integer as ORD- plus fixed-width base 36, so string order matches numeric order."""
+    digits = []
+    while value:
+        value, rest = divmod(value, 36)
+        digits.append(_ALPHABET[rest])
+    return ORDER_ID_PREFIX + "".join(reversed(digits)).rjust(ORDER_ID_WIDTH, "0")
+
+
+def default_node_id():
+    """This process's node id from ORDER_ID_NODE, which every snowflake process must set to its own value."""
+    node = os.getenv("ORDER_ID_NODE")
+    if node is None:
+        raise RuntimeError("ORDER_ID_NODE is not set; give every process its own node id, "
+                           "or use ORDER_ID_GENERATOR=sequence")
+    return int(node)
+
+
+class SnowflakeGenerator:
+    """Time + node + counter IDs, monotonic within the process and unique across nodes."""
+
+    def __init__(self, node_id=None):
+        self.node_id = default_node_id() if node_id is None else node_id
+        if not 0 <= self.node_id <= MAX_NODE:
+            raise ValueError(f"Node id must be between 0 and {MAX_NODE}")
+        self._epoch_ms = int(ORDER_ID_EPOCH.timestamp() * 1000)
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._counter = 0
+
+    def _now_ms(self):
+        return int(time.time() * 1000) - self._epoch_ms
+
+    def next_value(self):
+        with self._lock:
+            now = self._now_ms()
+            # A clock stepping backwards keeps using the last timestamp, so IDs never go down
+            if now <= self._last_ms:
+                now = self._last_ms
+                self._counter = (self._counter + 1) & MAX_COUNTER
+                if self._counter == 0:
+                    # Counter exhausted for this millisecond; wait for the next one
+                    while now <= self._last_ms:
+                        time.sleep(0.0001)
+                        now = self._now_ms()
+            else:
+                self._counter = 0
+            self._last_ms = now
+            return (now << (NODE_BITS + COUNTER_BITS)) | (self.node_id << COUNTER_BITS) | self._counter
+
+    def next_id(self, db=None):
+        return format_order_id(self.next_value())
+
+
+class SequenceGenerator:
+    """IDs from the order_id_sequences table; one short transaction per ID."""
+
+    def __init__(self, name=ORDER_SEQUENCE_NAME):
+        self.name = name
+
+    def next_value(self, db):
+        if not db.connection:
+            db.connect()
+        cursor = db.connection.cursor()
+        try:
+            # LAST_INSERT_ID(expr) returns the incremented value to this session without a second read lock
+            cursor.execute(
+                "UPDATE order_id_sequences SET value = LAST_INSERT_ID(value + 1) WHERE name = %s",
+                (self.name,)
+            )
+            if cursor.rowcount == 0:
+                raise RuntimeError(f"Order ID sequence '{self.name}' is missing; run migrations.py")
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            value = cursor.fetchone()[0]
+            db.connection.commit()
+            return value
+        except Exception:
+            db.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def next_id(self, db=None):
+        if db is None:
+            raise ValueError("The sequence order ID generator needs a DatabaseConnection")
+        return format_order_id(self.next_value(db))
+
+
+GENERATORS = {
+    "snowflake": SnowflakeGenerator,
+    "sequence": SequenceGenerator,
+}
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    """Process-wide generator selected by ORDER_ID_GENERATOR ("auto": snowflake only with an ORDER_ID_NODE)."""
+    global _generator
+    with _generator_lock:
+        if _generator is None:
+            name = ORDER_ID_GENERATOR
+            if name == "auto":
+                name = "snowflake" if os.getenv("ORDER_ID_NODE") is not None else "sequence"
+            if name not in GENERATORS:
+                raise ValueError(f"Unknown ORDER_ID_GENERATOR '{name}', expected 'auto' or one of {sorted(GENERATORS)}")
+            _generator = GENERATORS[name]()
+        return _generator
+
+
+def next_order_id(db=None):
+    """
+    Next order ID from the configured generator.
+    :param db: DatabaseConnection, required by the sequence backend.
+    :return: ID such as 'ORD-0AB12CD34EF56'.
+    """
+    return get_generator().next_id(db)
+
+
+def _bench_worker(args):
+    node_id, count = args
+    # Configured the way a deployment does it, through the environment and the default lookup
+    os.environ["ORDER_ID_NODE"] = str(node_id)
+    generator = SnowflakeGenerator()
+    ids = [generator.next_id() for _ in range(count)]
+    if ids != sorted(ids):
+        raise AssertionError(f"Node {node_id} produced IDs out of order")
+    return ids
+
+
+def bench(processes=4, count=50000):
+    """
+    Generate `count` IDs in each of `processes` processes, each started with its own
+    ORDER_ID_NODE as a process manager would, and check they are all unique.
+    """
+    from multiprocessing import Pool
+
+    start = time.perf_counter()
+    with Pool(processes) as pool:
+        batches = pool.map(_bench_worker, [(node, count) for node in range(processes)], chunksize=1)
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(batch) for batch in batches)
+    unique = len(set().union(*batches))
+    print(f"{total} IDs from {processes} processes in {elapsed:.2f}s ({total / elapsed:,.0f} IDs/s), {unique} unique")
+    if unique != total:
+        raise SystemExit("Duplicate order IDs generated")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "bench":
+        raise SystemExit("Usage: python order_ids.py bench [--processes N] [--count N]")
+    options = dict(zip(sys.argv[2::2], sys.argv[3::2]))
+    bench(int(options.get("--processes", 4)), int(options.get("--count", 50000)))
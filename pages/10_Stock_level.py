@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 from conn import DatabaseConnection
 from menu import menu
 
@@ -16,37 +15,19 @@ db.connect()
 
 st.header("📦📊 Current Stock Levels")
 
-# Fetch product stock
-def get_current_stock():
-    try:
-        if not db.connection or not db.connection.is_connected():
-            db.connect()
-
-        cursor = db.connection.cursor(dictionary=True)
-        query = """
-            SELECT 
-                product_id,
-                product_name,
-                opening_qty,
-                qty
-            FROM products
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return results
-
-    except Exception as e:
-        print(f"Error fetching stock: {e}")
-        return []
-
-# Load stock data
-stock_data = get_current_stock()
-
-if stock_data:
-    df = pd.DataFrame(stock_data)
-
+# Load stock data straight into typed columns (quantities arrive as float64)
+df = db.query_df("""
+    SELECT 
+        product_id,
+        product_name,
+        opening_qty,
+        qty
+    FROM products
+""", columns=["product_id", "product_name", "opening_qty", "qty"])
+
+if not df.empty:
     # Calculate Difference column
-    df['Difference'] = df['qty'].astype(float) - df['opening_qty'].astype(float)
+    df['Difference'] = df['qty'] - df['opening_qty']
 
     # Rename for clean display
     display_df = df.rename(columns={
@@ -77,16 +58,9 @@ if stock_data:
     search_product = st.text_input("Enter Product Name or Product ID to Search:")
 
     if search_product:
-        # Try to filter by product_id or product_name (case-insensitive)
-        try:
-            search_product_lower = search_product.lower()
-        except AttributeError:
-            search_product_lower = str(search_product).lower()
-
-        search_results = df[
-            df['product_name'].str.lower().str.contains(search_product_lower) |
-            df['product_id'].astype(str).str.contains(search_product)
-        ]
+        # Ranked matches on name, product ID or barcode from the cached search index
+        rank = {p["product_id"]: i for i, p in enumerate(db.search_products(search_product, limit=50))}
+        search_results = df[df['product_id'].isin(rank)].sort_values('product_id', key=lambda ids: ids.map(rank))
 
         
     # Fetch and show product movement
@@ -121,35 +95,19 @@ if stock_data:
                 # Fetch movements
                 st.subheader("📈 Stock Movement for Selected Product")
 
-                def get_product_movements(product_id):
-                    try:
-                        if not db.connection or not db.connection.is_connected():
-                            db.connect()
-
-                        cursor = db.connection.cursor(dictionary=True)
-                        query = """
-                            SELECT 
-                                grn_id,
-                                ordered_qty,
-                                received_qty,
-                                verified_qty,
-                                created_at
-                            FROM grn_items
-                            WHERE product_id = %s
-                            ORDER BY created_at DESC
-                        """
-                        cursor.execute(query, (product_id,))
-                        results = cursor.fetchall()
-                        return results
-
-                    except Exception as e:
-                        print(f"Error fetching product movements: {e}")
-                        return []
-
-                movement_data = get_product_movements(selected_product_id)
-
-                if movement_data:
-                    movement_df = pd.DataFrame(movement_data)
+                movement_df = db.query_df("""
+                    SELECT 
+                        grn_id,
+                        ordered_qty,
+                        received_qty,
+                        verified_qty,
+                        created_at
+                    FROM grn_items
+                    WHERE product_id = %s
+                    ORDER BY created_at DESC
+                """, (selected_product_id,))
+
+                if not movement_df.empty:
                     movement_df.rename(columns={
                         'grn_id': 'GRN Number',
                         'ordered_qty': 'Ordered Qty',
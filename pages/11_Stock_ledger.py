@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+from datetime import date, timedelta
 from conn import DatabaseConnection
 from menu import menu
 
@@ -15,95 +16,39 @@ st.title("📋📦 Stock Ledger (Product-wise Movement)")
 db = DatabaseConnection()
 db.connect()
 
-# Fetch all products
-def get_all_products():
-    try:
-        if not db.connection or not db.connection.is_connected():
-            db.connect()
-
-        cursor = db.connection.cursor(dictionary=True)
-        query = "SELECT product_id, product_name FROM products"
-        cursor.execute(query)
-        return cursor.fetchall()
-    except Exception as e:
-        print(f"Error fetching products: {e}")
-        return []
-
-# Fetch movements for a product
-def get_product_movements(product_id):
-    try:
-        if not db.connection or not db.connection.is_connected():
-            db.connect()
-
-        cursor = db.connection.cursor(dictionary=True)
-        query = """
-            SELECT 
-                movement_type,
-                quantity,
-                reference,
-                remarks,
-                created_at
-            FROM stock_movements
-            WHERE product_id = %s
-            ORDER BY created_at ASC
-        """
-        cursor.execute(query, (product_id,))
-        return cursor.fetchall()
-    except Exception as e:
-        print(f"Error fetching stock movements: {e}")
-        return []
-
 # Select Product
-products = get_all_products()
+products = db.fetch_all_products()
 
 if products:
     product_options = {f"{p['product_name']} (ID: {p['product_id']})": p['product_id'] for p in products}
     selected_product_label = st.selectbox("Select Product:", list(product_options.keys()))
     selected_product_id = product_options[selected_product_label]
 
-    # Load stock movements
-    movements = get_product_movements(selected_product_id)
-
-    # Load adjustments and merge into movements
-    adjustments = db.fetch_stock_adjustments(selected_product_id)
-    for adj in adjustments:
-        movements.append({
-            "movement_type": "ADJ",
-            "quantity": adj["quantity"] if adj["adjustment_type"] == "Increase" else -adj["quantity"],
-            "reference": f"Adjusted by {adj['adjusted_by']}",
-            "remarks": adj["reason"],
-            "created_at": adj["created_at"]
-        })
+    # Ledger window; everything before it is folded into the opening balance
+    today = date.today()
+    period = st.date_input("Period", value=[today - timedelta(days=90), today])
+    start_date, end_date = (period[0], period[-1]) if period else (None, None)
+
+    # Start from the first page whenever the product or period changes
+    ledger_key = (selected_product_id, start_date, end_date)
+    if st.session_state.get("ledger_key") != ledger_key:
+        st.session_state["ledger_key"] = ledger_key
+        st.session_state["ledger_page"] = 1
+
+    page = st.session_state["ledger_page"]
+    ledger_data = db.get_stock_ledger(selected_product_id, start_date, end_date, page=page)
+    total_pages = max(1, -(-ledger_data["total_rows"] // ledger_data["page_size"]))
+
+    opening_qty = ledger_data["opening_balance"]
+    unit = ledger_data["unit"]
 
-    if movements:
-        ledger = pd.DataFrame(movements)
-        ledger['Date'] = pd.to_datetime(ledger['created_at'])
-
-        # Adjust quantity signs
-        ledger['Quantity'] = ledger.apply(
-            lambda row: row['quantity'] if row['movement_type'] in ['IN', 'ADJ'] else -row['quantity'],
-            axis=1
-        )
-
-        # Get product info
-        product_info = db.get_product_opening_info(selected_product_id)
-        opening_qty = float(product_info['opening_qty'])
-        unit = product_info['unit_of_measure']
-
-        # Opening row
-        opening_row = {
-            'Date': pd.to_datetime("1970-01-01"),
-            'Movement': 'Opening Stock',
-            'Quantity': opening_qty,
-            'Running Balance': opening_qty,
-            'Reference': '',
-            'Remarks': '',
-            'Unit': unit
-        }
-
-        # Format ledger
+    if ledger_data["rows"]:
+        ledger = pd.DataFrame(ledger_data["rows"])
         ledger.rename(columns={
+            'created_at': 'Date',
             'movement_type': 'Movement',
+            'quantity': 'Quantity',
+            'running_balance': 'Running Balance',
             'reference': 'Reference',
             'remarks': 'Remarks'
         }, inplace=True)
@@ -114,36 +59,51 @@ if products:
             "OUT": "Stock Out",
             "ADJ": "Adjustment"
         })
-
         ledger['Unit'] = unit
-
-        # Sort by date
-        ledger.sort_values(by="Date", inplace=True)
-        ledger.reset_index(drop=True, inplace=True)
-
-        # Add running balance
-        ledger['Running Balance'] = opening_qty + ledger['Quantity'].cumsum()
-
-        # Append opening row
-        ledger = pd.concat([pd.DataFrame([opening_row]), ledger], ignore_index=True)
-        ledger['Running Balance'] = ledger['Quantity'].cumsum()
+        ledger['Date'] = pd.to_datetime(ledger['Date']).dt.strftime('%Y-%m-%d %H:%M:%S')
+
+        # Opening row on the first page
+        if page == 1:
+            opening_row = {
+                'Date': start_date.strftime('%Y-%m-%d') if start_date else '',
+                'Movement': 'Opening Stock',
+                'Quantity': opening_qty,
+                'Running Balance': opening_qty,
+                'Reference': '',
+                'Remarks': '',
+                'Unit': unit
+            }
+            ledger = pd.concat([pd.DataFrame([opening_row]), ledger], ignore_index=True)
 
         # Final column order
-        ledger['Date'] = ledger['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
         ledger = ledger[['Date', 'Movement', 'Quantity', 'Unit', 'Running Balance', 'Reference', 'Remarks']]
 
         st.subheader("📋 Stock Ledger")
         st.dataframe(ledger, use_container_width=True)
 
+        # Page navigation
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬅️ Previous", disabled=page <= 1):
+                st.session_state["ledger_page"] = page - 1
+                st.rerun()
+        with col2:
+            st.caption(f"Page {page} of {total_pages} · {ledger_data['total_rows']} entries")
+        with col3:
+            if st.button("Next ➡️", disabled=page >= total_pages):
+                st.session_state["ledger_page"] = page + 1
+                st.rerun()
+
         # Summary Section
+        totals = ledger_data["totals"]
         st.subheader("📊 Summary:")
         st.write(f"**Opening Stock:** {opening_qty} {unit}")
-        st.write(f"**Total IN:** {ledger[ledger['Movement'] == 'Stock In']['Quantity'].sum()} {unit}")
-        st.write(f"**Total OUT:** {ledger[ledger['Movement'] == 'Stock Out']['Quantity'].sum()} {unit}")
-        st.write(f"**Total Adjustments:** {ledger[ledger['Movement'] == 'Adjustment']['Quantity'].sum()} {unit}")
-        st.write(f"**Final Running Balance:** {ledger['Running Balance'].iloc[-1]} {unit}")
+        st.write(f"**Total IN:** {totals['IN']} {unit}")
+        st.write(f"**Total OUT:** {totals['OUT']} {unit}")
+        st.write(f"**Total Adjustments:** {totals['ADJ']} {unit}")
+        st.write(f"**Final Running Balance:** {ledger_data['closing_balance']} {unit}")
 
     else:
-        st.info("ℹ️ No stock movement records found for this product.")
+        st.info(f"ℹ️ No stock movement records found for this product in the selected period. Opening stock: {opening_qty} {unit}")
 else:
     st.warning("⚠️ No products available.")
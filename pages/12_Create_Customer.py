@@ -64,7 +64,7 @@ uploaded_file = st.file_uploader("Upload Filled CSV", type=["csv"])
 
 if uploaded_file:
     try:
-        df = pd.read_csv(uploaded_file)
+        df = pd.read_csv(uploaded_file, dtype=str)  # keep leading zeros in phone numbers
 
         # Validate columns
         expected_cols = {"customer_name", "contact", "address", "contact_person_name"}
@@ -74,25 +74,15 @@ if uploaded_file:
             st.dataframe(df)
 
             if st.button("Upload Customers"):
-                success_count = 0
-                skipped_count = 0
-
-                for _, row in df.iterrows():
-                    if pd.notna(row['customer_name']) and pd.notna(row['contact']):
-                        if db.customer_exists(row['customer_name'], row['contact']):
-                            skipped_count += 1
-                            continue
-
-                        success = db.insert_customer(
-                            name=row['customer_name'],
-                            contact=row['contact'],
-                            address=row.get('address', None),
-                            contact_person_name=row.get('contact_person_name', None)
-                        )
-                        if success:
-                            success_count += 1
-
-                st.success(f"✅ Uploaded {success_count} customers. Skipped {skipped_count} duplicate(s).")
+                result = db.bulk_upsert_customers(df)
+
+                if result["error"]:
+                    st.error(f"❌ Upload failed and was rolled back: {result['error']}")
+                else:
+                    skipped_count = result["existing"] + result["duplicates_in_file"]
+                    st.success(f"✅ Uploaded {result['inserted']} customers. Skipped {skipped_count} duplicate(s).")
+                    if result["invalid"]:
+                        st.warning(f"⚠️ {result['invalid']} row(s) without a name or contact were ignored.")
     except Exception as e:
         st.error(f"Error reading file: {e}")
 
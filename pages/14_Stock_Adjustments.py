@@ -59,6 +59,11 @@ if submitted:
         if success:
             st.success("Stock adjustment recorded.")
             st.rerun()
+        elif success is None:
+            st.error(
+                f"Stock of this product changed after it was shown as {current_stock} units, so the "
+                "adjustment was not saved. Please re-count and submit the new quantity again."
+            )
         else:
             st.error("Failed to record stock adjustment.")
 
@@ -1,5 +1,6 @@
 import streamlit as st
 from conn import DatabaseConnection
+from order_ids import next_order_id
 from datetime import datetime
 import pandas as pd
 from menu import menu
@@ -37,20 +38,24 @@ else:
         
     st.write("Enter the details of the order:")
 
-    # Customer Information
-    customers = db.get_all_customers()
+    # Customer Information: typeahead that only fetches the top matches
+    customer_query = st.text_input("Search Customer", placeholder="Start typing a customer or contact person name")
+    customers = db.search_customers(customer_query)
     if customers:
-        customer_options = {
-            f"{c['customer_name']} ({c['contact_person_name']}) - ID {c['id']}": c for c in customers
-        }
-        selected_customer_label = st.selectbox("Select Customer", list(customer_options.keys()))
-        selected_customer = customer_options[selected_customer_label]
+        customer_options = {c["id"]: c for c in customers}
+        selected_customer_id = st.selectbox(
+            "Select Customer",
+            list(customer_options),
+            format_func=lambda cid: f"{customer_options[cid]['customer_name']} ({customer_options[cid]['contact_person_name']}) - ID {cid}"
+        )
+        selected_customer = customer_options[selected_customer_id]
 
         customer_id = selected_customer["id"]
         customer_name = selected_customer["customer_name"]
         customer_contact = selected_customer.get("contact", "")  # optional, for display or logging
     else:
-        st.warning("⚠️ No customers found. Please create one first.")
+        if customer_query:
+            st.warning("⚠️ No matching customers found. Create the customer first if it is new.")
         customer_id = None
         customer_name = ""
         customer_contact = ""
@@ -145,7 +150,7 @@ else:
             st.error("Please fill in all required fields.")
         else:
             # Generate a unique Order ID
-            order_id = f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            order_id = next_order_id(db)
             order_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             order_status = "Pending"
             
@@ -14,14 +14,12 @@ else:
 db = DatabaseConnection()
 db.connect()
 
-# Fetch pending orders
+# Fetch pending orders (customer name and contact person come joined in)
 orders = db.fetch_pending_orders()
-order_summary_rows = []
 for order in orders:
-    customer_info = db.get_customer_by_id(order['customer_id'])
-    customer_label = (
-        f"{customer_info['customer_name']} ({customer_info['contact_person_name']})"
-        if customer_info else "Unknown"
+    order["customer_label"] = (
+        f"{order['customer_name']} ({order['contact_person_name']})"
+        if order.get("customer_name") else "Unknown"
     )
 
 if not orders:
@@ -34,7 +32,7 @@ else:
     for order in orders:
         order_summary_rows.append({
             "Order ID": order['order_id'],
-            "Customer": customer_label,
+            "Customer": order["customer_label"],
             "Order Created By": order['salesperson_name'],
             "Order Date": order['order_date'],
             "Status": order.get('accounts_approval_status', 'Pending')
@@ -64,28 +62,14 @@ else:
     # --- Order Details Section ---
     st.markdown("### 📄 View Specific Order Details")
 
-    order_display_options = []
-    for o in orders:
-        customer_info = db.get_customer_by_id(o['customer_id'])
-        customer_label = (
-            f"{customer_info['customer_name']} ({customer_info['contact_person_name']})"
-            if customer_info else "Unknown Customer"
-        )
-        print(customer_info)
-        order_display_options.append(f"{o['order_id']} - {customer_label}")
+    order_display_options = [f"{o['order_id']} - {o['customer_label']}" for o in orders]
     selected_order_display = st.selectbox("Select an Order", options=order_display_options)
 
     selected_order_id = selected_order_display.split(" - ")[0]
     selected_order = next(order for order in orders if order["order_id"] == selected_order_id)
 
-    customer_info = db.get_customer_by_id(selected_order['customer_id'])
-    customer_label = (
-        f"{customer_info['customer_name']} ({customer_info['contact_person_name']})"
-        if customer_info else "Unknown"
-    )
-
     st.markdown(f"### 🧾 Order Details for `{selected_order_id}`")
-    st.markdown(f"**Customer:** {customer_label}")
+    st.markdown(f"**Customer:** {selected_order['customer_label']}")
     st.markdown(f"**Salesperson:** {selected_order['salesperson_name']}")
     st.markdown(f"**Order Date:** {selected_order['order_date']}")
     st.markdown(f"**Status:** {selected_order.get('accounts_approval_status', 'Pending')}")
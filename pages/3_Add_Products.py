@@ -13,10 +13,6 @@ else:
     menu()
 
 
-def clean_nullable(value):
-    """Return None if value is NaN or empty, otherwise return the value itself."""
-    return None if pd.isna(value) or value == "" else value
-
 # Function to generate CSV template
 def generate_csv_template():
     sample_data = {
@@ -89,36 +85,20 @@ with st.expander("Upload CSV"):
             st.dataframe(df)
 
             if st.button("📥 Upload All"):
-                results = []
-
-                for _, row in df.iterrows():
-                    product_name = row["product_name"]
-                    unit_of_measure = row["unit_of_measure"]
-                    opening_qty = row["opening_qty"]
-                    barcode = clean_nullable(row.get("barcode"))
-                    batch_number = clean_nullable(row.get("batch_number"))
-                    expiration_date = clean_nullable(row.get("expiration_date"))
-
-                    # Convert expiration_date to correct format if not None
-                    if expiration_date:
-                        try:
-                            expiration_date = pd.to_datetime(expiration_date).date()
-                        except Exception as e:
-                            st.error(f"Invalid date format in row {_}: {expiration_date}")
-                            continue
-
-                    result = db.add_product(
-                        product_name,
-                        barcode,
-                        unit_of_measure,
-                        opening_qty,
-                        batch_number,
-                        expiration_date
-                    )
-                    results.append(result)
+                result = db.add_products_bulk(df)
 
-                if all(results):
-                    st.success(f"✅ Uploaded {len(results)} products successfully.")
+                if result["error"]:
+                    st.error(f"❌ Upload failed and was rolled back: {result['error']}")
+                elif result["failed"]:
+                    st.warning(
+                        f"⚠️ Uploaded {result['inserted']} products; {result['failed']} row(s) were rejected."
+                    )
                 else:
-                    st.warning(f"⚠️ Some products may have failed to upload. Check your data and try again.")
+                    st.success(
+                        f"✅ Uploaded {result['inserted']} products successfully "
+                        f"({result['rows_per_second']:.0f} rows/s)."
+                    )
+
+                if not result["errors"].empty:
+                    st.dataframe(result["errors"], use_container_width=True)
 
@@ -24,10 +24,9 @@ else:
     # Build the selectbox options with full customer labels
     order_options = []
     for o in pending_orders:
-        customer = db.get_customer_by_id(o["customer_id"])
         customer_label = (
-            f"{customer['customer_name']} ({customer['contact_person_name']})"
-            if customer else "Unknown Customer"
+            f"{o['customer_name']} ({o['contact_person_name']})"
+            if o["customer_name"] else "Unknown Customer"
         )
         order_options.append(f"{o['order_id']} - {customer_label}")
 
@@ -39,8 +38,7 @@ else:
     order = next(o for o in pending_orders if o["order_id"] == order_id)
 
     st.markdown(f"### 🧾 Order `{order['order_id']}`")
-    customer = db.get_customer_by_id(order["customer_id"])
-    st.write(f"**Customer:** {customer['customer_name']} ({customer['contact_person_name']})" if customer else "Unknown Customer")
+    st.write(f"**Customer:** {order['customer_name']} ({order['contact_person_name']})" if order["customer_name"] else "Unknown Customer")
     st.write(f"**Order Created By:** {order['salesperson_name']}")
     st.write(f"**Payment Terms:** {order['payment_terms']}")
     st.write(f"**Order Date:** {order['order_date']}")
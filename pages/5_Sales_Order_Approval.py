@@ -29,10 +29,9 @@ else:
         orders = [o for o in orders if o["director_approval_status"] == status_filter]
 
     for order in orders:
-        customer = db.get_customer_by_id(order["customer_id"])
         customer_label = (
-            f"{customer['customer_name']} ({customer['contact_person_name']})"
-            if customer else "Unknown Customer"
+            f"{order['customer_name']} ({order['contact_person_name']})"
+            if order["customer_name"] else "Unknown Customer"
         )
 
         with st.expander(f"{order['order_id']} — {customer_label} — [Final: {order['director_approval_status']}]"):
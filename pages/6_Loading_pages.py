@@ -15,6 +15,24 @@ st.title("🚛 Loading Team – Order Fulfillment")
 db = DatabaseConnection()
 db.connect()
 
+
+def apply_scan(order, scans, barcode, qty):
+    """
+    Add `qty` to the order line of the scanned product, in session state only.
+    The first line of that product still short of its ordered quantity is filled
+    first; once all are full, the scan goes to the last one as over-loading.
+    :return: (ok, message)
+    """
+    product = db.get_product_by_barcode(barcode)
+    if product is None:
+        return False, f"Unknown barcode {barcode}"
+    lines = [item for item in order["items"] if item["product_id"] == product["product_id"]]
+    if not lines:
+        return False, f"{product['product_name']} is not on order {order['order_id']}"
+    line = next((item for item in lines if scans.get(item["id"], 0.0) < float(item["quantity_ordered"])), lines[-1])
+    scans[line["id"]] = scans.get(line["id"], 0.0) + qty
+    return True, f"{product['product_name']}: {scans[line['id']]:g} / {float(line['quantity_ordered']):g}"
+
 orders = db.fetch_director_approved_orders()
 
 if not orders:
@@ -24,15 +42,39 @@ else:
     orders = sorted(orders, key=lambda x: x["order_date"])
 
     for order in orders:
-        customer = db.get_customer_by_id(order["customer_id"])
         customer_label = (
-            f"{customer['customer_name']} ({customer['contact_person_name']})"
-            if customer else "Unknown Customer"
+            f"{order['customer_name']} ({order['contact_person_name']})"
+            if order["customer_name"] else "Unknown Customer"
         )
 
         with st.expander(f"{order['order_id']} – {customer_label} – {order['order_date']}"):
             st.markdown(f"**Salesperson:** {order['salesperson_name']}")
             st.markdown(f"**Director Approval:** ✅ Approved")
+
+            # Scan mode: scans are kept in session state and written once, by Mark as Loaded
+            scan_mode = st.toggle("📷 Scan mode", key=f"scan_mode_{order['order_id']}")
+            scans = st.session_state.setdefault(f"scans_{order['order_id']}", {})
+            if scan_mode:
+                with st.form(f"scan_form_{order['order_id']}", clear_on_submit=True):
+                    scan_col, qty_col = st.columns([3, 1])
+                    with scan_col:
+                        barcode = st.text_input("Scan barcode", key=f"barcode_{order['order_id']}")
+                    with qty_col:
+                        scan_qty = st.number_input("Qty per scan", min_value=0.01, value=1.0, step=1.0,
+                                                   key=f"scan_qty_{order['order_id']}")
+                    # Scanners finish with Enter, which submits the form
+                    if st.form_submit_button("Add scan") and barcode.strip():
+                        ok, message = apply_scan(order, scans, barcode.strip(), scan_qty)
+                        st.session_state[f"last_scan_{order['order_id']}"] = (ok, message)
+
+                last_scan = st.session_state.get(f"last_scan_{order['order_id']}")
+                if last_scan:
+                    (st.success if last_scan[0] else st.error)(last_scan[1])
+                if st.button(f"↩️ Reset scans ({order['order_id']})"):
+                    scans.clear()
+                    st.session_state.pop(f"last_scan_{order['order_id']}", None)
+                    st.rerun()
+
             st.markdown("### 📦 Update Items")
 
             item_updates = []
@@ -61,12 +103,17 @@ else:
                 col1, col2 = st.columns([1.5, 1])
 
                 with col1:
-                    loaded_qty = st.number_input(
-                        f"Loaded Qty ", 
-                        min_value=0.0,
-                        value=item.get("loaded_quantity", item["quantity_ordered"]),
-                        step=0.01,
-                        key=f"loaded_qty_{item['id']}"            )
+                    if scan_mode:
+                        loaded_qty = scans.get(item["id"], 0.0)
+                        st.metric(label="Scanned Qty", value=f"{loaded_qty:g}",
+                                  delta=f"{loaded_qty - float(item['quantity_ordered']):g}")
+                    else:
+                        loaded_qty = st.number_input(
+                            f"Loaded Qty ", 
+                            min_value=0.0,
+                            value=item.get("loaded_quantity", item["quantity_ordered"]),
+                            step=0.01,
+                            key=f"loaded_qty_{item['id']}"            )
                 
                     
                 with col2:
@@ -92,31 +139,14 @@ else:
             col1, col2, col3 = st.columns(3)
             with col1:
                 if st.button(f"✅ Mark as Loaded ({order['order_id']})"):
-                    if db.update_loading_status(order["order_id"], "Loaded", loading_remarks, item_updates):
-                        # ✅ After marking as Loaded, decrease stock
-                        for item_update in item_updates:
-                            item_id = item_update["item_id"]
-                            loaded_qty = item_update["loaded_quantity"]
-
-                            # You need product_id for this item
-                            product_id = None
-                            for item in order["items"]:
-                                if item["id"] == item_id:
-                                    product_id = item["product_id"]
-                                    break
-
-                            if product_id and loaded_qty > 0:
-                                db.decrease_product_quantity(product_id, loaded_qty)
-                                db.log_stock_movement(
-                                product_id=product_id,
-                                movement_type='OUT',
-                                quantity=loaded_qty,
-                                reference=f"Order {order['order_id']}",
-                                remarks=item_update["loading_remarks"]
-                            )
-
-                    st.success("Order marked as Loaded and stock updated!")
-                    st.rerun()
+                    # Status, loaded quantities, stock and movements in one transaction
+                    if db.fulfil_order(order["order_id"], item_updates, loading_remarks):
+                        st.session_state.pop(f"scans_{order['order_id']}", None)
+                        st.session_state.pop(f"last_scan_{order['order_id']}", None)
+                        st.success("Order marked as Loaded and stock updated!")
+                        st.rerun()
+                    else:
+                        st.error("Failed to mark the order as Loaded; stock was not changed.")
 
             with col2:
                 if st.button(f"🕓 Still Pending ({order['order_id']})"):
@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-from conn import DatabaseConnection
+from conn import DatabaseConnection, ORDER_PAGE_SIZE
 from menu import menu
 
 
@@ -16,53 +15,59 @@ st.title("📦 Loading History – Fulfilled & Cancelled Orders")
 db = DatabaseConnection()
 db.connect()
 
-orders = db.fetch_loading_history()
+# Widget values come from one small query; no orders are loaded to build them
+options = db.loading_history_filter_options()
 
-if not orders:
+if options["min_date"] is None:
     st.info("No loaded or cancelled orders found.")
 else:
     # --- Sidebar filters ---
     with st.sidebar:
         st.header("🔍 Filter Orders")
-        
-        # Enrich orders with customer info
-        for order in orders:
-            customer = db.get_customer_by_id(order["customer_id"])
-            if customer:
-                order["customer_name"] = customer["customer_name"]
-                order["contact_person_name"] = customer["contact_person_name"]
-            else:
-                order["customer_name"] = "Unknown"
-                order["contact_person_name"] = ""
-
-        all_customers = sorted(list(set([f"{o['customer_name']} ({o['contact_person_name']})" for o in orders])))
-
-        customer_filter = st.multiselect("Customer", options=all_customers)
-        
-        status_filter = st.multiselect("Loading Status", options=["Loaded", "Cancelled"])
-        
-        date_min = min([o["order_date"] for o in orders])
-        date_max = max([o["order_date"] for o in orders])
-        start_date, end_date = st.date_input("Filter by Order Date", value=[date_min, date_max])
 
-    # Apply filters
-    filtered = []
-    for order in orders:
-        date_ok = start_date <= order["order_date"].date() <= end_date
-        customer_ok = not customer_filter or order["customer_name"] in customer_filter
-        status_ok = not status_filter or order["loading_status"] in status_filter
+        customers = {c["id"]: f"{c['customer_name']} ({c['contact_person_name']})" for c in options["customers"]}
+        customer_filter = st.multiselect("Customer", options=list(customers), format_func=customers.get)
+
+        status_filter = st.multiselect("Loading Status", options=["Loaded", "Cancelled"])
 
-        if date_ok and customer_ok and status_ok:
-            filtered.append(order)
+        date_min = options["min_date"].date()
+        date_max = options["max_date"].date()
+        dates = st.date_input("Filter by Order Date", value=[date_min, date_max])
+        # The range picker returns a single date while the second one is being chosen
+        start_date, end_date = (dates[0], dates[-1]) if dates else (date_min, date_max)
+
+    # Keyset paging restarts from the newest order whenever the filters change
+    filter_key = (tuple(customer_filter), tuple(status_filter), start_date, end_date)
+    if st.session_state.get("history_filter_key") != filter_key:
+        st.session_state["history_filter_key"] = filter_key
+        st.session_state["history_cursor"] = {}
+        st.session_state["history_page"] = 1
+
+    history_page = db.search_loading_history(
+        start_date, end_date, customer_filter, status_filter,
+        **st.session_state["history_cursor"]
+    )
+    filtered = history_page["orders"]
+    total_pages = max(1, -(-history_page["total"] // ORDER_PAGE_SIZE))
+
+    # A cursor left over from before the history changed can point past the end; start again
+    if not filtered and st.session_state["history_cursor"]:
+        st.session_state["history_cursor"] = {}
+        st.session_state["history_page"] = 1
+        st.rerun()
+
+    # Customer info comes joined in; fill the blanks for deleted customers
+    for order in filtered:
+        if not order["customer_name"]:
+            order["customer_name"] = "Unknown"
+            order["contact_person_name"] = ""
 
     if not filtered:
         st.warning("No matching orders found.")
     else:
-        # Summary
-        total_loaded = sum(1 for o in filtered if o['loading_status'] == 'Loaded')
-        total_cancelled = sum(1 for o in filtered if o['loading_status'] == 'Cancelled')
-        st.success(f"✅ Loaded Orders: {total_loaded}")
-        st.error(f"❌ Cancelled Orders: {total_cancelled}")
+        # Summary over every matching order, not just this page
+        st.success(f"✅ Loaded Orders: {history_page['status_counts'].get('Loaded', 0)}")
+        st.error(f"❌ Cancelled Orders: {history_page['status_counts'].get('Cancelled', 0)}")
 
         # Group orders
         grouped = {
@@ -127,3 +132,18 @@ else:
 
                         styled_df = df.style.apply(highlight_variances, axis=1)
                         st.dataframe(styled_df, use_container_width=True)
+
+    # --- Page navigation ---
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Previous", disabled=history_page["prev_cursor"] is None):
+            st.session_state["history_cursor"] = {"before": history_page["prev_cursor"]}
+            st.session_state["history_page"] -= 1
+            st.rerun()
+    with col_info:
+        st.caption(f"Page {st.session_state['history_page']} of {total_pages} · {history_page['total']} orders")
+    with col_next:
+        if st.button("Next ➡️", disabled=history_page["next_cursor"] is None):
+            st.session_state["history_cursor"] = {"after": history_page["next_cursor"]}
+            st.session_state["history_page"] += 1
+            st.rerun()
@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from conn import DatabaseConnection  # ✅ Correct import
+from conn import DatabaseConnection, read_grn_chunks
 from datetime import datetime
 from menu import menu
 
@@ -21,22 +21,20 @@ with st.expander("GRN uploading"):
     uploaded_file = st.file_uploader("Upload GRN Excel File", type=["csv", "xlsx"])
 
     if uploaded_file:
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
-
-        st.dataframe(df)
+        # Preview only the first rows; the full file is streamed in chunks on save
+        preview = next(read_grn_chunks(uploaded_file, chunk_size=50), pd.DataFrame())
+        st.dataframe(preview)
 
         if st.button("Save GRN to Database"):
-            for _, row in df.iterrows():
-                db.insert_grn_item(
-                    grn_id,
-                    int(row['product_id']),
-                    float(row['ordered_qty']),
-                    0.0  # Received quantity set as 0 initially
-                )
-            st.success("✅ GRN uploaded successfully!")
+            uploaded_file.seek(0)
+            result = db.save_grn(grn_id, read_grn_chunks(uploaded_file))  # Received quantity set as 0 initially
+
+            if result["error_count"]:
+                st.error(f"❌ GRN not saved: {result['error_count']} problem(s) found.")
+                for message in result["errors"]:
+                    st.write(f"- {message}")
+            else:
+                st.success(f"✅ GRN uploaded successfully! ({result['saved']} items)")
 
 with st.expander("GRN verification"):
     st.header("✅ Verify Goods Received - Dispatch Team")
@@ -46,7 +44,9 @@ with st.expander("GRN verification"):
     if grn_id:
         grn_data = db.get_grn_items(grn_id)
 
-        if grn_data:
+        if grn_data and any(row['verified_qty'] is not None for row in grn_data):
+            st.info(f"GRN {grn_id} has already been verified and its stock posted.")
+        elif grn_data:
             for row in grn_data:
                 # Get product details from the products table
                 product_details = db.get_product_details(row['product_id'])  # new method to be created
@@ -68,30 +68,16 @@ with st.expander("GRN verification"):
                 )
 
             if st.button("Save Verification"):
-                for index, row in df.iterrows():
-                    discrepancy = float(row['verified_qty']) - float(row['ordered_qty'])
-
-                    db.update_grn_verification(
-                        row['id'],
-                        row['verified_qty'],
-                        discrepancy
-                    )
-
-                    db.increase_product_quantity(
-                        row['product_id'],
-                        row['verified_qty']
-                    )
-
-                    db.log_stock_movement(
-                        product_id=row['product_id'],
-                        movement_type='IN',
-                        quantity=row['verified_qty'],
-                        reference=row['grn_id'],
-                        remarks="GRN Verified Entry"
-                    )
-
-                st.success("✅ Verification saved and stock updated!")
-                st.rerun()
+                verified_lines = [
+                    {"id": row['id'], "verified_qty": float(row['verified_qty'])}
+                    for _, row in df.iterrows()
+                ]
+
+                if db.verify_grn(grn_id, verified_lines):
+                    st.success("✅ Verification saved and stock updated!")
+                    st.rerun()
+                else:
+                    st.error("❌ Verification failed; no stock was changed.")
 
 
 
@@ -0,0 +1,344 @@
+"""
+SQL-side aggregations behind the Reports page.
+
+Every report is a single GROUP BY (or filtered) query returning a typed
+DataFrame, so memory and latency follow the size of the result rather than
+the order history. All reports take optional `start`/`end` dates (inclusive)
+and a `salesperson` filter.
+
+Sales reports read the days covered by the daily rollup tables (see
+migration 2) and merge in the orders after them live. refresh_sales_rollups()
+keeps the rollups current; the Reports page calls it at most every
+ROLLUP_REFRESH_INTERVAL seconds, and it can also be scheduled:
+
+    python reports.py refresh
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+ROLLUP_NAME = "daily_sales"
+
+# Changes newer than this are left for the next refresh, so rows still being committed are not skipped
+ROLLUP_SAFETY_LAG = timedelta(minutes=1)
+
+# Minimum seconds between two refreshes triggered from the Reports page in one process
+ROLLUP_REFRESH_INTERVAL = 60
+
+_last_refresh = {"at": 0.0}
+_refresh_lock = threading.Lock()
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _order_filters(start=None, end=None, salesperson=None):
+    """WHERE clause and params restricting orders `o` by date range and salesperson."""
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("o.order_date >= %s")
+        params.append(start)
+    if end is not None:
+        if isinstance(end, date) and not isinstance(end, datetime):
+            end = datetime.combine(end, datetime.min.time()) + timedelta(days=1)
+        clauses.append("o.order_date < %s")
+        params.append(end)
+    if salesperson:
+        clauses.append("o.salesperson_name = %s")
+        params.append(salesperson)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+
+def _rolled_through(db):
+    """Last day the rollups cover (rollup_state.rolled_through), or None if they were never built."""
+    try:
+        cursor = db.connection.cursor()
+        cursor.execute("SELECT rolled_through FROM rollup_state WHERE name = %s", (ROLLUP_NAME,))
+        row = cursor.fetchone()
+        cursor.close()
+        return _as_date(row[0]) if row else None
+    except Exception as e:
+        print(f"Error reading rollup state: {e}")
+        return None
+
+
+def _rollup_and_live_filters(db, start=None, end=None, salesperson=None):
+    """
+    Split a report window into the days the rollups cover (alias `r`, up to
+    rollup_state.rolled_through) and the live orders after them (alias `o`), so a
+    refresh that has not run for a while leaves no gap.
+    :return: (rollup_where, rollup_params, live_where, live_params); live_where is None
+             when the window ends before the first live day.
+    """
+    rolled_through = _rolled_through(db)
+    # Never rolled up: `r.sale_date < NULL` matches nothing and every day is read live
+    live_from = rolled_through + timedelta(days=1) if rolled_through is not None else None
+    start_day, end_day = _as_date(start), _as_date(end)
+
+    clauses, params = ["r.sale_date < %s"], [live_from]
+    if start_day is not None:
+        clauses.append("r.sale_date >= %s")
+        params.append(start_day)
+    if end_day is not None:
+        clauses.append("r.sale_date <= %s")
+        params.append(end_day)
+    if salesperson:
+        clauses.append("r.salesperson_name = %s")
+        params.append(salesperson)
+    rollup_where = "WHERE " + " AND ".join(clauses)
+
+    if live_from is not None and end_day is not None and end_day < live_from:
+        return rollup_where, params, None, []
+    live_start = max((day for day in (start_day, live_from) if day is not None), default=None)
+    live_where, live_params = _order_filters(live_start, end_day, salesperson)
+    return rollup_where, params, live_where, live_params
+
+
+def _frame(db, query, params, columns, dtypes):
+    return db.query_df(query, params, dtypes, columns=columns)
+
+
+def salespeople(db):
+    """Distinct salesperson names, for the filter widget."""
+    try:
+        cursor = db.connection.cursor()
+        cursor.execute("SELECT DISTINCT salesperson_name FROM orders ORDER BY salesperson_name")
+        names = [row[0] for row in cursor.fetchall() if row[0]]
+        cursor.close()
+        return names
+    except Exception as e:
+        print(f"Error fetching salespeople: {e}")
+        return []
+
+
+def top_products(db, start=None, end=None, salesperson=None):
+    """Quantity and value sold per product, highest value first."""
+    rollup_where, params, live_where, live_params = _rollup_and_live_filters(db, start, end, salesperson)
+    live = ""
+    if live_where is not None:
+        live = f"""
+            UNION ALL
+            SELECT oi.product_name, oi.quantity_ordered, oi.quantity_ordered * oi.unit_price
+            FROM order_items oi
+            JOIN orders o ON o.order_id = oi.order_id
+            {live_where}
+        """
+    return _frame(db, f"""
+        SELECT product_name, SUM(quantity), SUM(sales)
+        FROM (
+            SELECT r.product_name, r.quantity, r.sales
+            FROM daily_product_sales r
+            {rollup_where}
+            {live}
+        ) t
+        GROUP BY product_name
+        ORDER BY 3 DESC
+    """, params + live_params, ["Product", "Quantity Sold", "Total Sales"],
+        {"Product": "string", "Quantity Sold": "float64", "Total Sales": "float64"})
+
+
+def customer_activity(db, start=None, end=None, salesperson=None):
+    """Orders placed and order value per customer, highest value first."""
+    rollup_where, params, live_where, live_params = _rollup_and_live_filters(db, start, end, salesperson)
+    live = ""
+    if live_where is not None:
+        live = f"""
+            UNION ALL
+            SELECT o.customer_id, 1, o.total_amount
+            FROM orders o
+            {live_where}
+        """
+    return _frame(db, f"""
+        SELECT COALESCE(c.customer_name, 'Unknown') AS customer, SUM(t.orders), SUM(t.sales)
+        FROM (
+            SELECT r.customer_id, r.orders, r.sales
+            FROM daily_customer_sales r
+            {rollup_where}
+            {live}
+        ) t
+        LEFT JOIN customers c ON c.id = t.customer_id
+        GROUP BY customer
+        ORDER BY 3 DESC
+    """, params + live_params, ["Customer", "Orders Placed", "Total Sales"],
+        {"Customer": "string", "Orders Placed": "int64", "Total Sales": "float64"})
+
+
+def loading_variance(db, start=None, end=None, salesperson=None):
+    """Order lines whose loaded quantity differs from the ordered quantity."""
+    where, params = _order_filters(start, end, salesperson)
+    variance_filter = "COALESCE(oi.loaded_quantity, 0) <> oi.quantity_ordered"
+    where = f"{where} AND {variance_filter}" if where else f"WHERE {variance_filter}"
+    return _frame(db, f"""
+        SELECT
+            o.order_id, oi.product_name, oi.quantity_ordered,
+            COALESCE(oi.loaded_quantity, 0),
+            COALESCE(oi.loaded_quantity, 0) - oi.quantity_ordered,
+            COALESCE(c.customer_name, 'Unknown')
+        FROM order_items oi
+        JOIN orders o ON o.order_id = oi.order_id
+        LEFT JOIN customers c ON c.id = o.customer_id
+        {where}
+        ORDER BY o.order_date DESC, oi.id
+    """, params, ["Order ID", "Product", "Ordered Qty", "Loaded Qty", "Variance", "Customer"],
+        {"Order ID": "string", "Product": "string", "Ordered Qty": "float64",
+         "Loaded Qty": "float64", "Variance": "float64", "Customer": "string"})
+
+
+def monthly_sales(db, start=None, end=None, salesperson=None):
+    """Total order value per calendar month, oldest first."""
+    rollup_where, params, live_where, live_params = _rollup_and_live_filters(db, start, end, salesperson)
+    live = ""
+    if live_where is not None:
+        live = f"""
+            UNION ALL
+            SELECT o.order_date, o.total_amount
+            FROM orders o
+            {live_where}
+        """
+    return _frame(db, f"""
+        SELECT DATE_FORMAT(day, '%Y-%m') AS month, SUM(sales)
+        FROM (
+            SELECT r.sale_date AS day, r.sales
+            FROM daily_salesperson_sales r
+            {rollup_where}
+            {live}
+        ) t
+        GROUP BY month
+        ORDER BY month
+    """, params + live_params, ["Month", "Total Sales"], {"Month": "string", "Total Sales": "float64"})
+
+
+def _day_ranges(days):
+    """Group a set of dates into sorted (first, last) runs of consecutive days."""
+    ranges = []
+    for day in sorted(days):
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(r) for r in ranges]
+
+
+def _rebuild_days(cursor, first, last):
+    """Recompute all three rollups for the days first..last from orders and order_items."""
+    window = (first, last + timedelta(days=1))
+    for table in ("daily_product_sales", "daily_customer_sales", "daily_salesperson_sales"):
+        cursor.execute(f"DELETE FROM {table} WHERE sale_date BETWEEN %s AND %s", (first, last))
+
+    cursor.execute("""
+        INSERT INTO daily_product_sales (sale_date, salesperson_name, product_name, quantity, sales)
+        SELECT DATE(o.order_date), COALESCE(o.salesperson_name, ''), oi.product_name,
+               SUM(oi.quantity_ordered), SUM(oi.quantity_ordered * oi.unit_price)
+        FROM order_items oi
+        JOIN orders o ON o.order_id = oi.order_id
+        WHERE o.order_date >= %s AND o.order_date < %s
+        GROUP BY DATE(o.order_date), COALESCE(o.salesperson_name, ''), oi.product_name
+    """, window)
+    cursor.execute("""
+        INSERT INTO daily_customer_sales (sale_date, salesperson_name, customer_id, orders, sales)
+        SELECT DATE(o.order_date), COALESCE(o.salesperson_name, ''), COALESCE(o.customer_id, 0),
+               COUNT(*), SUM(o.total_amount)
+        FROM orders o
+        WHERE o.order_date >= %s AND o.order_date < %s
+        GROUP BY DATE(o.order_date), COALESCE(o.salesperson_name, ''), COALESCE(o.customer_id, 0)
+    """, window)
+    cursor.execute("""
+        INSERT INTO daily_salesperson_sales (sale_date, salesperson_name, orders, sales)
+        SELECT DATE(o.order_date), COALESCE(o.salesperson_name, ''), COUNT(*), SUM(o.total_amount)
+        FROM orders o
+        WHERE o.order_date >= %s AND o.order_date < %s
+        GROUP BY DATE(o.order_date), COALESCE(o.salesperson_name, '')
+    """, window)
+
+
+def refresh_sales_rollups(db):
+    """
+    Incrementally refresh the daily rollups for every closed day (before today).
+    Rebuilds days not rolled yet plus days holding orders created or changed since
+    the stored watermark, all in one transaction.
+    :return: Number of days rebuilt.
+    """
+    connection = db.connection
+    cursor = connection.cursor()
+    try:
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+
+        # Lock the state row so concurrent refreshes run one after another
+        cursor.execute("INSERT IGNORE INTO rollup_state (name) VALUES (%s)", (ROLLUP_NAME,))
+        cursor.execute(
+            "SELECT changed_through, rolled_through FROM rollup_state WHERE name = %s FOR UPDATE",
+            (ROLLUP_NAME,)
+        )
+        changed_through, rolled_through = cursor.fetchone()
+
+        cursor.execute("SELECT NOW()")
+        high_mark = cursor.fetchone()[0] - ROLLUP_SAFETY_LAG
+
+        days = set()
+
+        # Closed days that were never rolled up
+        if rolled_through is None:
+            cursor.execute("SELECT MIN(order_date) FROM orders")
+            oldest = cursor.fetchone()[0]
+            next_day = oldest.date() if oldest else today
+        else:
+            next_day = rolled_through + timedelta(days=1)
+        while next_day <= yesterday:
+            days.add(next_day)
+            next_day += timedelta(days=1)
+
+        # Closed days with orders created or changed since the last watermark
+        if changed_through is not None:
+            cursor.execute("""
+                SELECT DISTINCT DATE(order_date) FROM orders
+                WHERE updated_at > %s AND updated_at <= %s AND order_date < %s
+            """, (changed_through, high_mark, today))
+            days.update(row[0] for row in cursor.fetchall())
+
+        ranges = _day_ranges(days)
+        for first, last in ranges:
+            _rebuild_days(cursor, first, last)
+
+        cursor.execute(
+            "UPDATE rollup_state SET changed_through = %s, rolled_through = %s WHERE name = %s",
+            (max(high_mark, changed_through) if changed_through else high_mark,
+             max(yesterday, rolled_through) if rolled_through else yesterday,
+             ROLLUP_NAME)
+        )
+        connection.commit()
+        return len(days)
+    except Exception as e:
+        print(f"Error refreshing sales rollups: {e}")
+        connection.rollback()
+        return 0
+    finally:
+        cursor.close()
+
+
+def refresh_sales_rollups_if_due(db):
+    """Run refresh_sales_rollups() unless this process did so in the last ROLLUP_REFRESH_INTERVAL seconds."""
+    with _refresh_lock:
+        if time.monotonic() - _last_refresh["at"] < ROLLUP_REFRESH_INTERVAL:
+            return 0
+        _last_refresh["at"] = time.monotonic()
+    return refresh_sales_rollups(db)
+
+
+if __name__ == "__main__":
+    import sys
+    from conn import DatabaseConnection
+
+    if sys.argv[1:] != ["refresh"]:
+        raise SystemExit("Usage: python reports.py refresh")
+
+    db = DatabaseConnection(pooled=False)
+    db.connect()
+    if not db.connection:
+        raise SystemExit("Could not connect to the database.")
+    try:
+        print(f"Rebuilt {refresh_sales_rollups(db)} day(s) of sales rollups.")
+    finally:
+        db.disconnect()
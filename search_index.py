@@ -0,0 +1,185 @@
+"""
+In-memory product search.
+
+ProductSearchIndex is built once from the cached product list (see
+DatabaseConnection.product_search_index) and extended in place when a product
+is added, so a search never scans the catalogue:
+
+- product_id, barcode and the full name go into one sorted key list and the
+  later words of the name into another, both searched by prefix with bisect;
+- names are also split into trigrams, so queries of three or more characters
+  match anywhere in the name. Each trigram's postings are kept in rank order
+  (shortest name first), so the substring tier intersects the query's posting
+  lists in step and stops at the first `limit` matches instead of collecting
+  them all.
+
+Matches are ranked: exact id/barcode/name, then prefix of the id, barcode or
+name, then prefix of a later word of the name, then anywhere in the name.
+Lower tiers are only searched while the result list is not full, which keeps
+every query on a 100k catalogue under a millisecond
+(benchmarks/bench_search_index.py).
+"""
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+def _normalize(text):
+    return " ".join(str(text or "").lower().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _rank(product):
+    """Substring-tier sort key: shortest normalized name first, then by name and id."""
+    name = _normalize(product.get("product_name"))
+    return len(name), name, product["product_id"]
+
+
+def _intersect(postings):
+    """
+    Yield the ranks present in every one of the sorted posting lists, in rank order.
+    Leapfrog join: each list seeks (bisect from its last position) to the largest
+    rank seen so far, so long lists are skipped through rather than walked.
+    """
+    postings = sorted(postings, key=len)
+    if not postings or not postings[0]:
+        return
+    positions = [0] * len(postings)
+    target = postings[0][0]
+    while True:
+        for n, ranks in enumerate(postings):
+            position = bisect_left(ranks, target, positions[n])
+            if position == len(ranks):
+                return
+            positions[n] = position
+            if ranks[position] != target:
+                target = ranks[position]
+                break
+        else:
+            yield target
+            positions[0] += 1
+            if positions[0] == len(postings[0]):
+                return
+            target = postings[0][positions[0]]
+
+
+class ProductSearchIndex:
+    """Prefix and trigram index over product_id, barcode and product_name."""
+
+    def __init__(self, products=()):
+        self._products = {}
+        # Trigram -> (len(name), name, product_id) postings, sorted in that (rank) order
+        self._trigrams = defaultdict(list)
+        # Sorted (key, product_id) lists: ids, barcodes and full names; later words of names
+        self._keys = []
+        self._word_keys = []
+        # Indexing in rank order leaves every postings list sorted without sorting it
+        ranked = sorted((_rank(product), product) for product in products)
+        for rank, product in ranked:
+            keys, word_keys = self._index(product, rank)
+            for gram in _trigrams(rank[1]):
+                self._trigrams[gram].append(rank)
+            self._keys.extend(keys)
+            self._word_keys.extend(word_keys)
+        self._keys.sort()
+        self._word_keys.sort()
+
+    def __len__(self):
+        return len(self._products)
+
+    def _index(self, product, rank):
+        """Register a product and return its prefix entries for the key and word lists."""
+        _, name, product_id = rank
+        self._products[product_id] = product
+
+        keys = [(str(product_id), product_id), (name, product_id)]
+        barcode = _normalize(product.get("barcode"))
+        if barcode:
+            keys.append((barcode, product_id))
+        word_keys = [(word, product_id) for word in _WORD.findall(name)[1:]]
+        return keys, word_keys
+
+    def add(self, product):
+        """Index one more product (e.g. right after add_product) without rebuilding."""
+        if product["product_id"] in self._products:
+            return
+        rank = _rank(product)
+        keys, word_keys = self._index(product, rank)
+        for gram in _trigrams(rank[1]):
+            insort(self._trigrams[gram], rank)
+        for key in keys:
+            insort(self._keys, key)
+        for key in word_keys:
+            insort(self._word_keys, key)
+
+    def get(self, product_id):
+        return self._products.get(product_id)
+
+    def search(self, query, limit=20):
+        """
+        Ranked matches for a search box query: exact id/barcode/name first, then
+        prefixes of the id, barcode or name, then prefixes of later words, then
+        matches anywhere in the name (shortest names first). Each tier is only
+        searched while fewer than `limit` products have been found.
+        :param query: Product name fragment, product ID or barcode.
+        :param limit: Maximum number of products returned.
+        :return: List of product rows, best match first.
+        """
+        q = _normalize(query)
+        if not q or limit <= 0:
+            return []
+
+        found = {}  # product_id -> None, in rank order
+        for keys in (self._keys, self._word_keys):
+            start = bisect_left(keys, (q,))
+            # The range is sorted, so an exact key comes first
+            for i in range(start, len(keys)):
+                key, product_id = keys[i]
+                if len(found) >= limit or not key.startswith(q):
+                    break
+                found.setdefault(product_id)
+
+        if len(found) < limit and len(q) >= 3:
+            # Every match contains every trigram of the query, so it is in the intersection
+            # of their posting lists, in rank order; the substring check confirms each one
+            postings = [self._trigrams.get(gram, []) for gram in _trigrams(q)]
+            for _, name, product_id in _intersect(postings):
+                if q in name and product_id not in found:
+                    found[product_id] = None
+                    if len(found) >= limit:
+                        break
+
+        return [self._products[pid] for pid in found]
+
+
+def scan_products(products, query, limit=20):
+    """
+    Ranked matches without an index, for the moments before the first
+    ProductSearchIndex of a process is built: the same tiers as
+    ProductSearchIndex.search, ordered by name within a tier.
+    """
+    q = _normalize(query)
+    if not q or limit <= 0:
+        return []
+
+    ranked = []
+    for product in products:
+        name = _normalize(product.get("product_name"))
+        keys = (str(product["product_id"]), _normalize(product.get("barcode")), name)
+        if q in keys:
+            tier = 0
+        elif any(key.startswith(q) for key in keys):
+            tier = 1
+        elif any(word.startswith(q) for word in _WORD.findall(name)[1:]):
+            tier = 2
+        elif len(q) >= 3 and q in name:
+            tier = 3
+        else:
+            continue
+        ranked.append((tier, len(name), name, product["product_id"], product))
+    ranked.sort(key=lambda match: match[:4])
+    return [match[4] for match in ranked[:limit]]
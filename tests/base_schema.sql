@@ -0,0 +1,92 @@
+-- Tables as they exist before migrations.py runs, for the live-database tests.
+-- Columns follow what conn.py, reports.py and the pages read and write.
+
+CREATE TABLE users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(100) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    role VARCHAR(50) NOT NULL
+);
+
+CREATE TABLE products (
+    product_id INT AUTO_INCREMENT PRIMARY KEY,
+    product_name VARCHAR(255) NOT NULL,
+    barcode VARCHAR(100) NULL,
+    unit_of_measure VARCHAR(50) NULL,
+    opening_qty DECIMAL(20, 4) NOT NULL DEFAULT 0,
+    qty DECIMAL(20, 4) NOT NULL DEFAULT 0,
+    batch_number VARCHAR(255) NULL,
+    expiration_date DATE NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE customers (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    customer_name VARCHAR(255) NOT NULL,
+    contact VARCHAR(100) NOT NULL,
+    address TEXT NULL,
+    contact_person_name VARCHAR(255) NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE orders (
+    order_id VARCHAR(32) PRIMARY KEY,
+    customer_id INT NULL,
+    salesperson_name VARCHAR(255) NULL,
+    total_amount DECIMAL(20, 2) NOT NULL DEFAULT 0,
+    order_date DATETIME NOT NULL,
+    payment_terms VARCHAR(255) NULL,
+    accounts_approval_status VARCHAR(32) NOT NULL DEFAULT 'Pending',
+    accounts_remarks TEXT NULL,
+    director_approval_status VARCHAR(32) NOT NULL DEFAULT 'Pending',
+    director_remarks TEXT NULL,
+    loading_status VARCHAR(32) NOT NULL DEFAULT 'Pending Loading',
+    loading_remarks TEXT NULL
+);
+
+CREATE TABLE order_items (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    order_id VARCHAR(32) NOT NULL,
+    product_id INT NOT NULL,
+    product_name VARCHAR(255) NOT NULL,
+    quantity_ordered DECIMAL(20, 4) NOT NULL,
+    unit_price DECIMAL(20, 4) NOT NULL,
+    total_price DECIMAL(20, 4) NOT NULL,
+    loaded_quantity DECIMAL(20, 4) NULL,
+    loading_remarks TEXT NULL
+);
+
+CREATE TABLE grn_items (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    grn_id VARCHAR(64) NOT NULL,
+    product_id INT NOT NULL,
+    ordered_qty DECIMAL(20, 4) NOT NULL,
+    received_qty DECIMAL(20, 4) NOT NULL DEFAULT 0,
+    verified_qty DECIMAL(20, 4) NULL,
+    discrepancy DECIMAL(20, 4) NULL,
+    remarks TEXT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE stock_movements (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    movement_type VARCHAR(16) NOT NULL,
+    quantity DECIMAL(20, 4) NOT NULL,
+    reference VARCHAR(255) NULL,
+    remarks TEXT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE stock_adjustments (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    adjustment_type VARCHAR(16) NOT NULL,
+    quantity DECIMAL(20, 4) NOT NULL,
+    reason TEXT NULL,
+    adjusted_by VARCHAR(100) NULL,
+    previous_quantity DECIMAL(20, 4) NULL,
+    new_quantity DECIMAL(20, 4) NULL,
+    adjusted_at DATETIME NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,129 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conn import REFERENCE_CACHE, DatabaseConnection  # noqa: E402
+from instrumentation import instrument_connection  # noqa: E402
+
+# Live-database tests run against a throwaway schema on this server, and are skipped when it is unset
+TEST_DB_HOST = os.getenv("TEST_DB_HOST")
+TEST_DB_USER = os.getenv("TEST_DB_USER", "root")
+TEST_DB_PASSWORD = os.getenv("TEST_DB_PASSWORD", "")
+TEST_DB_NAME = os.getenv("TEST_DB_NAME", "rajchemsales_test")
+
+BASE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "base_schema.sql")
+
+
+class FakeCursor:
+    """Cursor double: records statements and answers them through the connection's responder."""
+
+    def __init__(self, connection, dictionary=False):
+        self.connection = connection
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+        self.with_rows = True
+
+    def execute(self, sql, params=()):
+        self.connection.statements.append((" ".join(sql.split()), tuple(params or ())))
+        self.rows = list(self.connection.respond(sql, tuple(params or ())) or [])
+        self.rowcount = len(self.rows)
+
+    def executemany(self, sql, rows):
+        for row in rows:
+            self.execute(sql, row)
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, respond):
+        self.respond = respond
+        self.statements = []
+        self.unread_result = False
+
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self, dictionary)
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def fake_db():
+    """DatabaseConnection wired to a FakeConnection; call it with a respond(sql, params) function."""
+    def make(respond=lambda sql, params: []):
+        db = DatabaseConnection(pooled=False)
+        db.connection = instrument_connection(FakeConnection(respond), db.render_stats)
+        return db
+    return make
+
+
+@pytest.fixture(scope="module")
+def mysql_db():
+    """
+    Fresh TEST_DB_NAME database with tests/base_schema.sql and every migration applied.
+    Yields a function returning new connected (unpooled) DatabaseConnections to it.
+    """
+    if not TEST_DB_HOST:
+        pytest.skip("TEST_DB_HOST is not set")
+    import mysql.connector
+    from migrations import migrate
+
+    try:
+        server = mysql.connector.connect(host=TEST_DB_HOST, user=TEST_DB_USER, password=TEST_DB_PASSWORD)
+    except mysql.connector.Error as e:
+        pytest.skip(f"Test database server unavailable: {e}")
+    cursor = server.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{TEST_DB_NAME}`")
+    cursor.execute(f"CREATE DATABASE `{TEST_DB_NAME}`")
+    cursor.execute(f"USE `{TEST_DB_NAME}`")
+    with open(BASE_SCHEMA) as f:
+        for statement in f.read().split(";"):
+            lines = [line for line in statement.splitlines() if not line.lstrip().startswith("--")]
+            if "".join(lines).strip():
+                cursor.execute("\n".join(lines))
+    server.commit()
+
+    connections = []
+
+    def connect():
+        db = DatabaseConnection(TEST_DB_HOST, TEST_DB_USER, TEST_DB_PASSWORD, TEST_DB_NAME, pooled=False)
+        db.connect()
+        assert db.connection is not None, "Could not connect to the test database"
+        connections.append(db)
+        return db
+
+    # Cached reference lists are keyed by version only, which restarts with every fresh database
+    REFERENCE_CACHE.invalidate()
+    migrate(connect())
+    yield connect
+
+    for db in connections:
+        db.disconnect()
+    REFERENCE_CACHE.invalidate()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{TEST_DB_NAME}`")
+    cursor.close()
+    server.close()
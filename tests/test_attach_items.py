@@ -0,0 +1,40 @@
+import math
+
+import pytest
+
+from conn import ITEM_BATCH_SIZE
+
+
+def order_responder(n):
+    """Answer the orders query with n orders and each item query with one item per order."""
+    def respond(sql, params):
+        if "FROM order_items" in sql:
+            return [{"id": i, "order_id": order_id} for i, order_id in enumerate(params)]
+        return [{"order_id": f"ORD-{i:05}"} for i in range(n)]
+    return respond
+
+
+@pytest.mark.parametrize("n", [1, 1000, 5000])
+def test_item_queries_grow_with_batches_not_orders(fake_db, n):
+    db = fake_db(order_responder(n))
+
+    orders = db.fetch_orders()
+
+    item_queries = [sql for sql, _ in db.connection.statements if "FROM order_items" in sql]
+    assert len(item_queries) == math.ceil(n / ITEM_BATCH_SIZE)
+    assert db.render_stats.queries == 1 + math.ceil(n / ITEM_BATCH_SIZE)
+    assert len(orders) == n
+    assert all(len(order["items"]) == 1 for order in orders)
+
+
+def test_items_keep_their_order(fake_db):
+    def respond(sql, params):
+        if "FROM order_items" in sql:
+            return [{"id": 2, "order_id": "B"}, {"id": 1, "order_id": "A"}, {"id": 3, "order_id": "B"}]
+        return [{"order_id": "A"}, {"order_id": "B"}, {"order_id": "C"}]
+    db = fake_db(respond)
+
+    orders = {order["order_id"]: order for order in db.fetch_orders()}
+
+    assert [item["id"] for item in orders["B"]["items"]] == [2, 3]
+    assert orders["C"]["items"] == []
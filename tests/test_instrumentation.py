@@ -0,0 +1,59 @@
+import pytest
+
+import instrumentation
+from conftest import FakeConnection
+from conn import _case_update
+from instrumentation import STATS, RenderStats, instrument_connection, instrument_methods, normalize_sql
+
+
+@pytest.mark.parametrize("size", [2, 10, 1000])
+def test_batched_statements_share_one_key(size):
+    tuples = ", ".join(["(%s, %s)"] * size)
+    assert normalize_sql(f"SELECT id FROM customers WHERE (customer_name, contact) IN ({tuples})") == \
+        "SELECT id FROM customers WHERE (customer_name, contact) IN ((%s, ...), ...)"
+
+    whens = " ".join(["WHEN %s THEN %s"] * size)
+    ids = ", ".join(["%s"] * size)
+    assert normalize_sql(f"UPDATE products SET qty = qty + CASE product_id {whens} END WHERE product_id IN ({ids})") == \
+        "UPDATE products SET qty = qty + CASE product_id WHEN %s THEN %s ... END WHERE product_id IN (%s, ...)"
+
+
+def test_case_update_keys_stay_short(fake_db):
+    db = fake_db()
+    STATS.reset()
+    cursor = db.connection.cursor()
+    for size in (2, 50, 900):
+        _case_update(cursor, "order_items", "id", ("loaded_quantity", "loading_remarks"),
+                     [(i, 1.0, "") for i in range(size)])
+
+    keys = list(STATS.snapshot()["statements"])
+    assert len(keys) == 1
+    assert len(keys[0]) < 200
+
+
+def test_generator_methods_are_charged_for_their_statements(monkeypatch):
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0)  # log every statement with its method
+
+    @instrument_methods
+    class Streamer:
+        def __init__(self):
+            self.render_stats = RenderStats()
+            self.connection = instrument_connection(FakeConnection(lambda sql, params: [(1,), (2,)]),
+                                                    self.render_stats)
+
+        def stream(self):
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT n FROM numbers")
+            yield from cursor.fetchall()
+            cursor.execute("SELECT n FROM more_numbers")
+
+    STATS.reset()
+    streamer = Streamer()
+    rows = streamer.stream()
+    assert STATS.snapshot()["slow_queries"] == []  # nothing runs until the generator is consumed
+    assert list(rows) == [(1,), (2,)]
+
+    snapshot = STATS.snapshot()
+    assert [query["method"] for query in snapshot["slow_queries"]] == ["stream", "stream"]
+    assert snapshot["methods"]["stream"]["count"] == 1
+    assert streamer.render_stats.method_stack == []
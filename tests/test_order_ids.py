@@ -0,0 +1,36 @@
+import pytest
+
+import order_ids
+
+
+@pytest.fixture
+def fresh_generator(monkeypatch):
+    monkeypatch.setattr(order_ids, "_generator", None)
+    monkeypatch.setattr(order_ids, "ORDER_ID_GENERATOR", "auto")
+
+
+def test_snowflake_needs_an_explicit_node(monkeypatch):
+    monkeypatch.delenv("ORDER_ID_NODE", raising=False)
+    with pytest.raises(RuntimeError):
+        order_ids.SnowflakeGenerator()
+
+    monkeypatch.setenv("ORDER_ID_NODE", "2000")
+    with pytest.raises(ValueError):
+        order_ids.SnowflakeGenerator()
+
+
+def test_auto_falls_back_to_the_sequence_without_a_node(monkeypatch, fresh_generator):
+    monkeypatch.delenv("ORDER_ID_NODE", raising=False)
+    assert isinstance(order_ids.get_generator(), order_ids.SequenceGenerator)
+
+
+def test_auto_uses_snowflake_with_a_node(monkeypatch, fresh_generator):
+    monkeypatch.setenv("ORDER_ID_NODE", "7")
+    generator = order_ids.get_generator()
+    assert isinstance(generator, order_ids.SnowflakeGenerator)
+    assert generator.node_id == 7
+
+
+def test_bench_ids_are_unique_across_processes(capsys):
+    order_ids.bench(processes=3, count=5000)
+    assert "15000 unique" in capsys.readouterr().out
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from conn import ORDER_PAGE_SIZE, REVIEWED_ORDERS_WHERE
+
+
+def test_reviewed_page_merges_one_indexed_query_per_branch(fake_db):
+    db = fake_db()
+    cursor = (datetime(2025, 1, 31), "ORD-0000000000042")
+    db.fetch_reviewed_orders_page(after=cursor)
+
+    sql, params = db.connection.statements[0]
+    assert sql.count("UNION ALL") == len(REVIEWED_ORDERS_WHERE) - 1
+    assert " OR o.director_approval_status" not in sql
+    assert sql.endswith("ORDER BY order_date DESC, order_id DESC LIMIT %s")
+    # Every branch carries the keyset cursor and its own LIMIT, then the merged page is cut again
+    per_branch = (cursor[0], cursor[0], cursor[1], ORDER_PAGE_SIZE + 1)
+    assert params == per_branch * len(REVIEWED_ORDERS_WHERE) + (ORDER_PAGE_SIZE + 1,)
+
+
+def test_reviewed_count_sums_the_branches(fake_db):
+    db = fake_db(lambda sql, params: [(7,)])
+    assert db.count_reviewed_orders() == 7
+
+    sql, _ = db.connection.statements[0]
+    assert sql.count("SELECT COUNT(*)") == len(REVIEWED_ORDERS_WHERE)
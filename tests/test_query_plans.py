@@ -0,0 +1,303 @@
+"""
+EXPLAIN every statement conn.py and reports.py run against a migrated, seeded
+schema and fail on full table scans (type = ALL).
+
+Each case calls one DatabaseConnection method or report with realistic
+arguments while a recording connection captures its SQL and parameters; the
+statements are then EXPLAINed on a second connection. Needs TEST_DB_HOST (see
+conftest.py).
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import exports
+import reports
+from conn import REFERENCE_QUERIES, invalidate_dashboard_counts
+
+# Tables of a handful of rows, where a scan is the cheapest plan
+SMALL_TABLES = {"reference_versions", "rollup_state", "order_id_sequences", "schema_migrations"}
+
+# Whole reference lists are read on purpose and cached process-wide
+ALLOWED_STATEMENTS = {" ".join(sql.split()) for _, sql in REFERENCE_QUERIES.values()}
+
+# Cases that read the whole orders table by design; pages use the paginated variants
+FULL_SCAN_CASES = {
+    "fetch_orders": "unpaginated list of every order",
+    "fetch_all_orders": "unpaginated list of every order",
+    "fetch_reviewed_orders": "unpaginated list of most orders",
+    "fetch_loading_history": "unpaginated list of most orders",
+    "dashboard_counts": "one pass over orders computes all six counters, cached for DASHBOARD_CACHE_TTL",
+}
+
+CUSTOMERS = 2000
+PRODUCTS = 2000
+ORDERS = 20000
+DAYS = 400
+
+
+class RecordingCursor:
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        self._statements.append((sql, params))
+        return self._cursor.execute(sql, params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class RecordingConnection:
+    def __init__(self, connection, statements):
+        self._connection = connection
+        self._statements = statements
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._connection.cursor(*args, **kwargs), self._statements)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def _order_statuses(rng):
+    accounts = rng.choices(["Pending", "Approved", "Rejected"], [10, 80, 10])[0]
+    director, loading = "Pending", "Pending Loading"
+    if accounts == "Approved":
+        director = rng.choices(["Pending", "Approved", "Rejected"], [10, 85, 5])[0]
+    if director == "Approved":
+        loading = rng.choices(["Pending Loading", "Loaded", "Cancelled"], [10, 85, 5])[0]
+    return accounts, director, loading
+
+
+@pytest.fixture(scope="module")
+def seeded(mysql_db):
+    """Seed a few months of orders, stock and GRNs, roll up all but the last days, and ANALYZE."""
+    db = mysql_db()
+    rng = random.Random(5)
+    cursor = db.connection.cursor()
+    now = datetime.now().replace(microsecond=0)
+
+    cursor.executemany(
+        "INSERT INTO users (username, password_hash, role) VALUES (%s, %s, %s)",
+        [(f"user{i}", "x", "admin") for i in range(5)]
+    )
+    cursor.executemany(
+        "INSERT INTO customers (customer_name, contact, address, contact_person_name) VALUES (%s, %s, %s, %s)",
+        [(f"Customer {i:05d}", f"98{i:08d}", "Address", f"Person {i:05d}") for i in range(CUSTOMERS)]
+    )
+    cursor.executemany(
+        "INSERT INTO products (product_name, barcode, unit_of_measure, opening_qty, qty) VALUES (%s, %s, %s, %s, %s)",
+        [(f"Product {i:05d}", f"890{i:010d}", "KG", 1000, 1000) for i in range(PRODUCTS)]
+    )
+    cursor.executemany(
+        "INSERT INTO stock_lots (product_id, batch_number, expiration_date, qty) VALUES (%s, %s, %s, %s)",
+        [(pid, f"B{pid}-{n}", date.today() + timedelta(days=30 * (n + 1)), 500)
+         for pid in range(1, PRODUCTS + 1) for n in range(2)]
+    )
+
+    orders, items = [], []
+    for i in range(ORDERS):
+        order_id = f"ORD-{i:013d}"
+        order_date = now - timedelta(days=DAYS * i / ORDERS, minutes=rng.randrange(600))
+        accounts, director, loading = _order_statuses(rng)
+        orders.append((order_id, rng.randrange(1, CUSTOMERS + 1), f"sales{rng.randrange(10)}", 200, order_date,
+                       accounts, director, loading))
+        for _ in range(2):
+            pid = rng.randrange(1, PRODUCTS + 1)
+            loaded = 10 if loading == "Loaded" else None
+            items.append((order_id, pid, f"Product {pid - 1:05d}", 10, 10, 100, loaded))
+    cursor.executemany("""
+        INSERT INTO orders (order_id, customer_id, salesperson_name, total_amount, order_date,
+                            accounts_approval_status, director_approval_status, loading_status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, orders)
+    cursor.executemany("""
+        INSERT INTO order_items (order_id, product_id, product_name, quantity_ordered, unit_price, total_price,
+                                 loaded_quantity)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, items)
+
+    cursor.executemany(
+        "INSERT INTO stock_movements (product_id, movement_type, quantity, reference, created_at) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        [(rng.randrange(1, PRODUCTS + 1), rng.choice(["IN", "OUT"]), 5, "seed", now - timedelta(days=rng.randrange(DAYS)))
+         for _ in range(20000)]
+    )
+    cursor.executemany(
+        "INSERT INTO stock_adjustments (product_id, adjustment_type, quantity, reason, adjusted_by, created_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        [(rng.randrange(1, PRODUCTS + 1), "Increase", 1, "seed", "user0", now - timedelta(days=rng.randrange(DAYS)))
+         for _ in range(2000)]
+    )
+    cursor.executemany(
+        "INSERT INTO grn_items (grn_id, product_id, ordered_qty, received_qty, created_at) VALUES (%s, %s, %s, %s, %s)",
+        [(f"GRN-{i // 10}", rng.randrange(1, PRODUCTS + 1), 20, 0, now - timedelta(days=rng.randrange(DAYS)))
+         for i in range(5000)]
+    )
+    db.connection.commit()
+
+    # Roll up everything, then leave the last two closed days for the recorded incremental refresh
+    reports.refresh_sales_rollups(db)
+    cursor.execute(
+        "UPDATE rollup_state SET rolled_through = %s, changed_through = NOW() WHERE name = %s",
+        (date.today() - timedelta(days=3), reports.ROLLUP_NAME)
+    )
+    for table in ("users", "customers", "products", "stock_lots", "orders", "order_items", "stock_movements",
+                  "stock_adjustments", "grn_items", "daily_product_sales", "daily_customer_sales",
+                  "daily_salesperson_sales"):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    db.connection.commit()
+
+    cursor.execute("""
+        SELECT o.order_id FROM orders o
+        WHERE o.director_approval_status = 'Approved' AND o.loading_status = 'Pending Loading'
+        ORDER BY o.order_date DESC LIMIT 2
+    """)
+    loading_orders = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT id, order_id FROM order_items WHERE order_id IN (%s, %s)", tuple(loading_orders)
+    )
+    items_by_order = {}
+    for item_id, order_id in cursor.fetchall():
+        items_by_order.setdefault(order_id, []).append(item_id)
+    cursor.execute("SELECT id FROM grn_items WHERE grn_id = 'GRN-1'")
+    grn_lines = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+
+    return {
+        "connect": mysql_db,
+        "loading_orders": loading_orders,
+        "items_by_order": items_by_order,
+        "grn_lines": grn_lines,
+        "start": date.today() - timedelta(days=30),
+        "end": date.today(),
+    }
+
+
+def _item_updates(data, order_id):
+    return [{"item_id": item_id, "loaded_quantity": 10, "loading_remarks": ""}
+            for item_id in data["items_by_order"][order_id]]
+
+
+def _reviewed_second_page(db):
+    first = db.fetch_reviewed_orders_page()
+    return db.fetch_reviewed_orders_page(after=first["next_cursor"])
+
+
+CASES = [
+    ("fetch_orders", lambda db, d: db.fetch_orders()),
+    ("fetch_pending_orders", lambda db, d: db.fetch_pending_orders()),
+    ("fetch_director_pending_orders", lambda db, d: db.fetch_director_pending_orders()),
+    ("fetch_director_approved_orders", lambda db, d: db.fetch_director_approved_orders()),
+    ("fetch_orders_by_accounts_status", lambda db, d: db.fetch_orders_by_accounts_status("Approved")),
+    ("fetch_reviewed_orders", lambda db, d: db.fetch_reviewed_orders()),
+    ("fetch_reviewed_orders_page", lambda db, d: _reviewed_second_page(db)),
+    ("count_reviewed_orders", lambda db, d: db.count_reviewed_orders()),
+    ("fetch_loading_history", lambda db, d: db.fetch_loading_history()),
+    ("fetch_loading_history_page", lambda db, d: db.fetch_loading_history_page()),
+    ("count_loading_history", lambda db, d: db.count_loading_history()),
+    ("search_loading_history", lambda db, d: db.search_loading_history()),
+    ("search_loading_history_filtered", lambda db, d: db.search_loading_history(
+        d["start"], d["end"], customer_ids=[1, 2, 3], statuses=["Loaded"])),
+    ("loading_history_filter_options", lambda db, d: db.loading_history_filter_options()),
+    ("fetch_all_orders", lambda db, d: db.fetch_all_orders()),
+    ("fetch_all_orders_page", lambda db, d: db.fetch_all_orders_page()),
+    ("count_all_orders", lambda db, d: db.count_all_orders()),
+    ("dashboard_counts", lambda db, d: (invalidate_dashboard_counts(), db.dashboard_counts())),
+    ("count_pending_approvals_for_accounts", lambda db, d: db.count_pending_approvals_for_accounts()),
+    ("count_pending_approvals_for_director", lambda db, d: db.count_pending_approvals_for_director()),
+    ("count_pending_for_loading", lambda db, d: db.count_pending_for_loading()),
+    ("get_user_by_username", lambda db, d: db.get_user_by_username("user1")),
+    ("warm_reference_cache", lambda db, d: db.warm_reference_cache()),
+    ("get_product_opening_info", lambda db, d: db.get_product_opening_info(7)),
+    ("get_product_stock", lambda db, d: db.get_product_stock(7)),
+    ("fetch_stock_adjustments", lambda db, d: db.fetch_stock_adjustments(7)),
+    ("get_stock_ledger", lambda db, d: db.get_stock_ledger(7, d["start"], d["end"])),
+    ("get_grn_items", lambda db, d: db.get_grn_items("GRN-2")),
+    ("customer_exists", lambda db, d: db.customer_exists("Customer 00042", "9800000042")),
+    ("search_customers", lambda db, d: db.search_customers("Customer 0004")),
+    ("salespeople", lambda db, d: reports.salespeople(db)),
+    ("top_products", lambda db, d: reports.top_products(db, d["start"], d["end"])),
+    ("customer_activity", lambda db, d: reports.customer_activity(db, d["start"], d["end"], "sales1")),
+    ("monthly_sales", lambda db, d: reports.monthly_sales(db, d["start"], d["end"])),
+    ("loading_variance", lambda db, d: reports.loading_variance(db, d["start"], d["end"], "sales1")),
+    ("refresh_sales_rollups", lambda db, d: reports.refresh_sales_rollups(db)),
+    ("update_accounts_approval", lambda db, d: db.update_accounts_approval("ORD-0000000000010", "Approved", "")),
+    ("update_director_approval", lambda db, d: db.update_director_approval("ORD-0000000000010", "Approved", "")),
+    ("update_loading_status", lambda db, d: db.update_loading_status(
+        d["loading_orders"][1], "Pending Loading", "", _item_updates(d, d["loading_orders"][1]))),
+    ("fulfil_order", lambda db, d: db.fulfil_order(
+        d["loading_orders"][0], _item_updates(d, d["loading_orders"][0]), "")),
+    ("verify_grn", lambda db, d: db.verify_grn("GRN-1", [{"id": i, "verified_qty": 20} for i in d["grn_lines"]])),
+    ("save_grn", lambda db, d: db.save_grn("GRN-NEW", pd.DataFrame({"product_id": [1, 2], "ordered_qty": [5, 6]}))),
+    ("log_stock_adjustment", lambda db, d: db.log_stock_adjustment(9, "Decrease", 3, "count", "user0", db.get_product_stock(9), 0)),
+    ("increase_product_quantity", lambda db, d: db.increase_product_quantity(9, 2)),
+    ("decrease_product_quantity", lambda db, d: db.decrease_product_quantity(9, 2)),
+    ("add_product", lambda db, d: db.add_product("Product new", "8900000099999", "KG", 5)),
+    ("add_products_bulk", lambda db, d: db.add_products_bulk(pd.DataFrame({
+        "product_name": ["Bulk A", "Bulk B"], "unit_of_measure": ["KG", "KG"], "opening_qty": [1, 2]}))),
+    ("insert_customer", lambda db, d: db.insert_customer("Customer new", "9999999999")),
+    ("bulk_upsert_customers", lambda db, d: db.bulk_upsert_customers(pd.DataFrame({
+        "customer_name": ["Customer 00001", "Customer bulk"], "contact": ["9800000001", "9111111111"]}))),
+]
+
+
+def _explainable(sql):
+    """The statement to EXPLAIN, or None for plain INSERTs and statements without tables."""
+    sql = " ".join(sql.split())
+    keyword = sql.split(" ", 1)[0].upper()
+    if keyword == "INSERT":
+        # INSERT ... SELECT: only the SELECT reads anything
+        position = sql.upper().find(" SELECT ")
+        return sql[position + 1:] if position >= 0 else None
+    if keyword in ("SELECT", "UPDATE", "DELETE", "WITH") or sql.startswith("("):
+        return sql
+    return None
+
+
+def _full_scans(explainer, statements):
+    """(table, sql) for every non-allowlisted type=ALL access in the statements' plans."""
+    scans = []
+    cursor = explainer.connection.cursor(dictionary=True)
+    for sql, params in statements:
+        query = _explainable(sql)
+        if query is None or query in ALLOWED_STATEMENTS:
+            continue
+        cursor.execute("EXPLAIN " + query, tuple(params or ()))
+        for row in cursor.fetchall():
+            table = row.get("table") or ""
+            # <derivedN>/<unionN> are the temporary results of already-checked subqueries
+            if row.get("type") == "ALL" and not table.startswith("<") and table not in SMALL_TABLES:
+                scans.append((table, query))
+    cursor.close()
+    return scans
+
+
+@pytest.mark.parametrize("name, call", CASES, ids=[name for name, _ in CASES])
+def test_no_full_table_scans(seeded, name, call):
+    db = seeded["connect"]()
+    statements = []
+    db.connection = RecordingConnection(db.connection, statements)
+    call(db, seeded)
+    assert statements, f"{name} ran no SQL"
+
+    scans = _full_scans(seeded["connect"](), statements)
+    if name in FULL_SCAN_CASES:
+        pytest.skip(f"Full scan expected: {FULL_SCAN_CASES[name]}")
+    assert not scans, f"{name} scans whole tables:\n" + "\n".join(f"{table}: {sql}" for table, sql in scans)
+
+
+@pytest.mark.parametrize("name", sorted(exports.EXPORTS))
+def test_dated_exports_use_indexes(seeded, name):
+    """Date-bounded exports read a range; unbounded ones stream the whole table on purpose."""
+    sql, params, _ = exports.export_query(name, seeded["start"], seeded["end"])
+    scans = _full_scans(seeded["connect"](), [(sql, params)])
+    assert not scans, f"{name} export scans whole tables:\n" + "\n".join(f"{t}: {s}" for t, s in scans)
@@ -0,0 +1,56 @@
+from datetime import date, datetime, timedelta
+
+import reports
+
+
+def _report_db(fake_db, rolled_through):
+    def respond(sql, params):
+        if "FROM rollup_state" in sql:
+            return [(rolled_through,)]
+        return []
+    return fake_db(respond)
+
+
+def _report_query(db):
+    return next((sql, params) for sql, params in db.connection.statements if "daily_salesperson_sales" in sql)
+
+
+def test_days_after_a_stale_rollup_are_read_live(fake_db):
+    rolled_through = date.today() - timedelta(days=5)
+    db = _report_db(fake_db, rolled_through)
+    reports.monthly_sales(db)
+
+    sql, params = _report_query(db)
+    first_live_day = rolled_through + timedelta(days=1)
+    assert "r.sale_date < %s" in sql and "o.order_date >= %s" in sql
+    # Rollup side stops where the live side starts: nothing lost, nothing counted twice
+    assert params == (first_live_day, first_live_day)
+
+
+def test_window_inside_the_rollups_has_no_live_part(fake_db):
+    db = _report_db(fake_db, date.today() - timedelta(days=1))
+    start, end = date.today() - timedelta(days=30), date.today() - timedelta(days=10)
+    reports.monthly_sales(db, start, end)
+
+    sql, params = _report_query(db)
+    assert "FROM orders" not in sql
+    assert params == (date.today(), start, end)
+
+
+def test_window_start_after_the_rollups(fake_db):
+    db = _report_db(fake_db, date.today() - timedelta(days=5))
+    start = date.today() - timedelta(days=2)
+    reports.top_products(db, start, salesperson="asha")
+
+    sql, params = next((s, p) for s, p in db.connection.statements if "daily_product_sales" in s)
+    assert params[-2:] == (start, "asha")
+
+
+def test_never_rolled_up_reads_everything_live(fake_db):
+    db = _report_db(fake_db, None)
+    start = datetime(2025, 1, 1)
+    reports.customer_activity(db, start)
+
+    sql, params = next((s, p) for s, p in db.connection.statements if "daily_customer_sales" in s)
+    # `r.sale_date < NULL` matches no rollup row
+    assert params == (None, start.date(), start.date())
@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+import conn
+from search_index import ProductSearchIndex, scan_products
+
+PRODUCTS = [
+    {"product_id": 1, "product_name": "Sodium Chloride", "barcode": "8901"},
+    {"product_id": 2, "product_name": "Potassium Chloride Technical", "barcode": "8902"},
+    {"product_id": 3, "product_name": "Chloride Test", "barcode": "8903"},
+    {"product_id": 4, "product_name": "Calcium Chloride Flakes", "barcode": "8904"},
+    {"product_id": 5, "product_name": "Sodium", "barcode": "8905"},
+]
+
+
+@pytest.mark.parametrize("search", [
+    lambda query, limit=20: ProductSearchIndex(PRODUCTS).search(query, limit),
+    lambda query, limit=20: scan_products(PRODUCTS, query, limit),
+], ids=["index", "scan"])
+def test_tiers(search):
+    ids = lambda query, *args: [p["product_id"] for p in search(query, *args)]
+    assert ids("sodium") == [5, 1]          # exact name, then name prefix
+    assert ids("chlor")[0] == 3             # name prefix, then later words
+    assert sorted(ids("chlor")[1:]) == [1, 2, 4]
+    assert ids("ide tec") == [2]            # substring only
+    assert ids("8903") == [3]               # barcode
+    assert ids("chlor", 2) == [3, 1]
+
+
+def test_substring_tier_ranks_by_name_length():
+    products = [{"product_id": i, "product_name": f"grade {'x' * (i % 7)} powder {i}"} for i in range(1, 501)]
+    index = ProductSearchIndex(products)
+    ranked = sorted(products, key=lambda p: (len(p["product_name"]), p["product_name"]))
+    assert index.search("de x", 10) == [p for p in ranked if "de x" in p["product_name"]][:10]
+
+
+def test_substring_tier_finds_rare_matches_of_common_trigrams():
+    products = [{"product_id": i, "product_name": f"calcium carbonate {i}"} for i in range(1, 3001)]
+    products += [{"product_id": i, "product_name": f"ferric chloride {i}"} for i in range(3001, 6001)]
+    products.append({"product_id": 9999, "product_name": "technical grade calcium chloride anhydrous flakes"})
+    index = ProductSearchIndex(products)
+    assert [p["product_id"] for p in index.search("um chl")] == [9999]
+    assert index.search("um chl") == scan_products(products, "um chl")
+
+
+def test_add_keeps_postings_in_rank_order():
+    index = ProductSearchIndex(PRODUCTS)
+    index.add({"product_id": 6, "product_name": "Chloride", "barcode": None})
+    assert [p["product_id"] for p in index.search("lorid", 3)] == [6, 3, 1]
+
+
+@pytest.fixture
+def fresh_index(monkeypatch):
+    conn.REFERENCE_CACHE.invalidate()
+    monkeypatch.setattr(conn, "_search_index", {"index": None, "version": None, "building": None, "appended": []})
+    yield
+    conn.REFERENCE_CACHE.invalidate()
+
+
+def _products_db(fake_db, version):
+    def respond(sql, params):
+        if "FROM reference_versions" in sql:
+            return [("products", version)]
+        if "FROM products" in sql:
+            return [dict(p, unit_of_measure="KG") for p in PRODUCTS]
+        return []
+    return fake_db(respond)
+
+
+def _join_builds():
+    for thread in threading.enumerate():
+        if thread.name == "product-search-index":
+            thread.join(5)
+
+
+def _blocked_index(monkeypatch):
+    """Make index builds wait for the returned event."""
+    release = threading.Event()
+
+    class SlowIndex(ProductSearchIndex):
+        def __init__(self, products):
+            release.wait(5)
+            super().__init__(products)
+
+    monkeypatch.setattr(conn, "ProductSearchIndex", SlowIndex)
+    return release, SlowIndex
+
+
+def test_index_is_built_off_the_calling_thread(fake_db, monkeypatch, fresh_index):
+    release, SlowIndex = _blocked_index(monkeypatch)
+    db = _products_db(fake_db, 3)
+    # The build is blocked, so this answer comes from the fallback scan
+    assert [p["product_id"] for p in db.search_products("sodium")] == [5, 1]
+    assert db.product_search_index() is None
+
+    release.set()
+    _join_builds()
+    assert isinstance(db.product_search_index(), SlowIndex)
+
+
+def test_product_added_during_the_build_lands_in_the_index(fake_db, monkeypatch, fresh_index):
+    release, _ = _blocked_index(monkeypatch)
+    _products_db(fake_db, 3).product_search_index()
+
+    added = {"product_id": 6, "product_name": "Sodium Nitrate", "barcode": None, "unit_of_measure": "KG"}
+    conn.REFERENCE_CACHE.append("products", 4, added)
+    conn._add_to_search_index(4, added)
+    release.set()
+    _join_builds()
+
+    db = _products_db(fake_db, 4)
+    index = db.product_search_index()
+    assert [p["product_id"] for p in index.search("nitrate")] == [6]
+    # Up to date with version 4, so no second build was started
+    assert not any(thread.name == "product-search-index" for thread in threading.enumerate())
+    assert conn._search_index["version"] == 4
+
+    added = dict(added, product_id=7, product_name="Sodium Nitrite")
+    conn.REFERENCE_CACHE.append("products", 5, added)
+    conn._add_to_search_index(5, added)
+    assert _products_db(fake_db, 5).product_search_index() is index
+    assert [p["product_id"] for p in index.search("nitri")] == [7]
+
+
+def test_cached_rows_are_not_shared(fake_db, fresh_index):
+    db = _products_db(fake_db, 3)
+    db.fetch_all_products()[0]["product_name"] = "changed"
+    db.get_product(2)["product_name"] = "changed"
+    db.search_products("sodium")[0]["product_name"] = "changed"
+    assert [p["product_name"] for p in db.fetch_all_products()] == [p["product_name"] for p in PRODUCTS]
+    _join_builds()
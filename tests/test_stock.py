@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+import conn
+
+
+def _grn_db(fake_db, verified_qty):
+    def respond(sql, params):
+        if sql.lstrip().startswith("SELECT id, product_id, ordered_qty, verified_qty FROM grn_items"):
+            return [(1, 10, 5.0, verified_qty), (2, 11, 3.0, verified_qty)]
+        if "FROM products" in sql and "FOR UPDATE" in sql:
+            return [(pid, 100.0) for pid in params]
+        return []
+    return fake_db(respond)
+
+
+LINES = [{"id": 1, "verified_qty": 5}, {"id": 2, "verified_qty": 2}]
+
+
+def test_verify_grn_posts_stock_once(fake_db):
+    db = _grn_db(fake_db, None)
+    assert db.verify_grn("GRN-7", LINES)
+
+    statements = [sql for sql, _ in db.connection.statements]
+    assert any(sql.startswith("UPDATE grn_items") for sql in statements)
+    assert any(sql.startswith("UPDATE products") for sql in statements)
+
+
+def test_verify_grn_rejects_verified_lines(fake_db):
+    db = _grn_db(fake_db, 5.0)
+    assert not db.verify_grn("GRN-7", LINES)
+
+    # Nothing but the locking read ran
+    assert [sql for sql, _ in db.connection.statements if not sql.startswith("SELECT")] == []
+
+
+def _lots_db(fake_db, lots):
+    """Answer the FEFO lot reads from `lots` rows, like idx_stock_lots_fefo would."""
+    def respond(sql, params):
+        if not sql.lstrip().startswith("SELECT"):
+            return []
+        product_id, *keyset, limit = params
+        dated = "expiration_date IS NOT NULL" in sql
+        rows = sorted((lot for lot in lots if lot[1] == product_id and (lot[3] is not None) == dated),
+                      key=lambda lot: (lot[3], lot[0]) if dated else lot[0])
+        if keyset:
+            rows = [lot for lot in rows if ((lot[3], lot[0]) if dated else lot[0]) > (
+                (keyset[0], keyset[2]) if dated else keyset[0])]
+        return rows[:limit]
+    return fake_db(respond)
+
+
+def test_draw_down_reads_lots_in_batches_until_covered(fake_db, monkeypatch):
+    monkeypatch.setattr(conn, "LOT_BATCH_SIZE", 2)
+    lots = [(n, 10, f"B{n}", date(2030, 1, 1) + timedelta(days=n % 4), 5.0) for n in range(1, 9)]
+    lots.append((9, 10, "UNDATED", None, 100.0))
+    db = _lots_db(fake_db, lots)
+    cursor = db.connection.cursor()
+
+    movements = conn._draw_down_lots(cursor, [(10, 12.0, "ORD-1", "")])
+    # Expiries cycle every four lots, so FEFO takes lots 4, 8 then part of 1
+    assert [(m[5], m[2]) for m in movements] == [("B4", 5.0), ("B8", 5.0), ("B1", 2.0)]
+    reads = [sql for sql, _ in db.connection.statements if sql.startswith("SELECT")]
+    assert len(reads) == 2 and all("LIMIT %s FOR UPDATE" in sql for sql in reads)
+    writes = [(sql.split()[0], params) for sql, params in db.connection.statements if not sql.startswith("SELECT")]
+    assert writes == [("UPDATE", (1, 3.0, 1)), ("DELETE", (4, 8))]
+
+
+def test_draw_down_falls_through_to_undated_lots(fake_db, monkeypatch):
+    monkeypatch.setattr(conn, "LOT_BATCH_SIZE", 2)
+    lots = [(1, 10, "B1", date(2030, 1, 1), 1.0), (2, 10, None, None, 1.0), (3, 10, None, None, 1.0),
+            (4, 10, None, None, 1.0)]
+    db = _lots_db(fake_db, lots)
+
+    movements = conn._draw_down_lots(db.connection.cursor(), [(10, 10.0, "ADJ", "")])
+    assert [m[2] for m in movements] == [1.0, 1.0, 1.0, 1.0, 6.0]
+    assert movements[-1][5] is None
+
+
+def test_bulk_import_seeds_qty_and_lots_from_the_new_rows(fake_db):
+    def respond(sql, params):
+        if "MAX(product_id)" in sql:
+            return [(41,)]
+        if "FROM reference_versions" in sql:
+            return [(1,)]
+        return []
+    db = fake_db(respond)
+
+    result = db.add_products_bulk(pd.DataFrame({
+        "product_name": ["A", "B", "C"], "unit_of_measure": "KG", "opening_qty": [1, 2, 3],
+    }))
+    assert result["inserted"] == 3
+    inserts = [params for sql, params in db.connection.statements if sql.startswith("INSERT INTO products")]
+    # qty starts at opening_qty, like the lot built from it
+    assert [params[3:5] for params in inserts] == [(1.0, 1.0), (2.0, 2.0), (3.0, 3.0)]
+    lots = [(sql, params) for sql, params in db.connection.statements if sql.startswith("INSERT INTO stock_lots")]
+    assert len(lots) == 1
+    assert "SELECT p.product_id, p.batch_number, p.expiration_date, p.qty" in lots[0][0]
+    assert lots[0][1] == (41,)
+
+
+def _adjustment_db(fake_db, qty):
+    def respond(sql, params):
+        if "FROM products" in sql and "FOR UPDATE" in sql:
+            return [(qty,)] if "product_id = %s" in sql else [(pid, qty) for pid in params]
+        return []
+    return fake_db(respond)
+
+
+def test_stock_adjustment_saves_against_the_counted_stock(fake_db):
+    db = _adjustment_db(fake_db, 40.0)
+    assert db.log_stock_adjustment(10, "Decrease", 5, "count", "tester", 40.0, 35.0) is True
+    assert any(sql.startswith("INSERT INTO stock_adjustments") for sql, _ in db.connection.statements)
+
+
+def test_stock_adjustment_reports_stock_that_moved(fake_db):
+    db = _adjustment_db(fake_db, 38.0)
+    assert db.log_stock_adjustment(10, "Decrease", 5, "count", "tester", 40.0, 35.0) is None
+    # Nothing but the locking read ran
+    assert [sql for sql, _ in db.connection.statements if not sql.startswith("SELECT")] == []
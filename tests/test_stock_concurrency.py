@@ -0,0 +1,150 @@
+"""
+Stress test for the stock transactions: loading, GRN verification and stock
+adjustments run concurrently from many threads on the same few products, then
+the books must still balance. Needs TEST_DB_HOST (see conftest.py).
+"""
+import random
+import threading
+
+import pytest
+
+PRODUCTS = 4
+OPENING_QTY = 10000
+ORDERS = 60
+GRNS = 30
+ADJUSTMENTS = 60
+THREADS = 12
+
+
+@pytest.fixture
+def stock_db(mysql_db):
+    db = mysql_db()
+    rng = random.Random(16)
+    cursor = db.connection.cursor()
+
+    cursor.executemany(
+        "INSERT INTO products (product_id, product_name, unit_of_measure, opening_qty, qty) VALUES (%s, %s, %s, %s, %s)",
+        [(pid, f"Shared {pid}", "KG", OPENING_QTY, OPENING_QTY) for pid in range(1, PRODUCTS + 1)]
+    )
+    # Opening stock split over lots with different expiry dates, as migration 7 would not create them here
+    cursor.executemany(
+        "INSERT INTO stock_lots (product_id, batch_number, expiration_date, qty) VALUES (%s, %s, %s, %s)",
+        [(pid, f"B{pid}-{n}", f"2030-0{n + 1}-01", OPENING_QTY / 4) for pid in range(1, PRODUCTS + 1) for n in range(4)]
+    )
+
+    orders = {}
+    for n in range(ORDERS):
+        order_id = f"ORD-STRESS{n:06d}"
+        cursor.execute("""
+            INSERT INTO orders (order_id, customer_id, salesperson_name, total_amount, order_date,
+                                accounts_approval_status, director_approval_status)
+            VALUES (%s, 1, 'stress', 0, NOW(), 'Approved', 'Approved')
+        """, (order_id,))
+        # Every order touches every product, in a different order, to provoke lock conflicts
+        updates = []
+        for pid in rng.sample(range(1, PRODUCTS + 1), PRODUCTS):
+            cursor.execute("""
+                INSERT INTO order_items (order_id, product_id, product_name, quantity_ordered, unit_price, total_price)
+                VALUES (%s, %s, %s, 10, 1, 10)
+            """, (order_id, pid, f"Shared {pid}"))
+            updates.append({"item_id": cursor.lastrowid, "loaded_quantity": rng.randint(1, 10), "loading_remarks": ""})
+        orders[order_id] = updates
+
+    grns = {}
+    for n in range(GRNS):
+        grn_id = f"GRN-STRESS-{n}"
+        lines = []
+        for pid in rng.sample(range(1, PRODUCTS + 1), PRODUCTS):
+            cursor.execute(
+                "INSERT INTO grn_items (grn_id, product_id, ordered_qty, received_qty) VALUES (%s, %s, 20, 0)",
+                (grn_id, pid)
+            )
+            lines.append({"id": cursor.lastrowid, "verified_qty": rng.randint(0, 20)})
+        grns[grn_id] = lines
+
+    db.connection.commit()
+    cursor.close()
+    return {"connect": mysql_db, "orders": orders, "grns": grns, "rng": rng}
+
+
+def _worker(connect, jobs, errors):
+    db = connect()
+    try:
+        while True:
+            try:
+                job = jobs.pop()
+            except IndexError:
+                return
+            job(db)
+    except Exception as e:  # pragma: no cover - surfaced by the assertion below
+        errors.append(e)
+    finally:
+        db.disconnect()
+
+
+def test_concurrent_stock_mutations_keep_the_books_balanced(stock_db):
+    rng = stock_db["rng"]
+    results = {"fulfilled": [], "verified": []}
+
+    def fulfil(order_id, updates):
+        return lambda db: results["fulfilled"].append(db.fulfil_order(order_id, updates, "stress"))
+
+    def verify(grn_id, lines):
+        return lambda db: results["verified"].append(db.verify_grn(grn_id, lines))
+
+    def adjust(pid, kind, qty):
+        def run(db):
+            # Counted against a stock figure that other threads keep moving: re-read and retry on conflict
+            while db.log_stock_adjustment(pid, kind, qty, "stress", "tester", db.get_product_stock(pid), 0) is None:
+                pass
+        return run
+
+    # Every order and GRN is submitted twice, so the double-posting guards are raced as well
+    jobs = []
+    for order_id, updates in stock_db["orders"].items():
+        jobs += [fulfil(order_id, updates)] * 2
+    for grn_id, lines in stock_db["grns"].items():
+        jobs += [verify(grn_id, lines)] * 2
+    for _ in range(ADJUSTMENTS):
+        jobs.append(adjust(rng.randint(1, PRODUCTS), rng.choice(["Increase", "Decrease"]), rng.randint(1, 15)))
+    rng.shuffle(jobs)
+
+    errors = []
+    threads = [threading.Thread(target=_worker, args=(stock_db["connect"], jobs, errors)) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    assert results["fulfilled"].count(True) == len(stock_db["orders"])
+    assert results["verified"].count(True) == len(stock_db["grns"])
+
+    db = stock_db["connect"]()
+    cursor = db.connection.cursor()
+    cursor.execute("""
+        SELECT p.product_id, p.opening_qty, p.qty,
+               (SELECT COALESCE(SUM(CASE WHEN m.movement_type = 'IN' THEN m.quantity ELSE -m.quantity END), 0)
+                  FROM stock_movements m WHERE m.product_id = p.product_id),
+               (SELECT COALESCE(SUM(CASE WHEN a.adjustment_type = 'Increase' THEN a.quantity ELSE -a.quantity END), 0)
+                  FROM stock_adjustments a WHERE a.product_id = p.product_id),
+               (SELECT COALESCE(SUM(l.qty), 0) FROM stock_lots l WHERE l.product_id = p.product_id),
+               (SELECT COUNT(*) FROM stock_lots l WHERE l.product_id = p.product_id AND l.qty < 0)
+        FROM products p
+        ORDER BY p.product_id
+    """)
+    for product_id, opening, qty, moved, adjusted, in_lots, negative_lots in cursor.fetchall():
+        assert float(qty) == pytest.approx(float(opening) + float(moved) + float(adjusted)), product_id
+        # Stock never ran out, so every unit on hand is in exactly one lot
+        assert float(in_lots) == pytest.approx(float(qty)), product_id
+        assert negative_lots == 0, product_id
+
+    # One lot per verified GRN line, never two
+    cursor.execute("""
+        SELECT batch_number, product_id, COUNT(*) FROM stock_lots
+        WHERE batch_number LIKE 'GRN-STRESS-%'
+        GROUP BY batch_number, product_id
+        HAVING COUNT(*) > 1
+    """)
+    assert cursor.fetchall() == []
+    cursor.close()